@@ -1,18 +1,465 @@
 from ast import literal_eval
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from hashlib import sha256
 from itertools import product
-from random import shuffle
-from math import ceil
+import json
+import os
+import zipfile
+from zlib import crc32
 
-from matplotlib.animation import FuncAnimation, PillowWriter
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import statsmodels.formula.api as smf
 
-from boarding_simulator import Boarding
+from boarding_simulator import Boarding, ENGINE_VERSION
+from profiling import BoardingStats, ProfiledBoarding
+
+
+def replicate_seeds(base_seed, cell, start, stop):
+    """Return a list of random seeds for replicates start to stop - 1 of
+    a cell. Each seed depends only on the base seed, the cell's 
+    parameters and the replicate number, so results are the same however
+    the replicates are split between processes.
+    """
+    cell_key = crc32(repr(cell).encode())
+    return [int(np.random.SeedSequence([base_seed, cell_key, replicate])
+                .generate_state(1)[0])
+            for replicate in range(start, stop)]
+
+
+class StepStatistics:
+    """Class to keep running statistics of the steps taken in the 
+    simulations of one cell without keeping the steps themselves: the 
+    number of simulations, the mean, the sum of squared differences from
+    the mean and a histogram of the number of simulations taking each
+    number of steps.
+
+    Arguments
+        steps - optional list of steps to start with
+    """
+    def __init__(self, steps=()):
+        self.n_runs = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.add(steps)
+
+    @classmethod
+    def from_histogram(cls, steps, counts):
+        """Return the statistics of simulations where counts[i] 
+        simulations took steps[i] steps.
+        """
+        statistics = cls()
+        steps = np.asarray(steps, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.int64)
+        statistics.counts = np.bincount(steps, weights=counts).astype(np.int64)
+        statistics.n_runs = int(counts.sum())
+        statistics.mean = float((steps * counts).sum() / statistics.n_runs)
+        statistics.m2 = float((counts * (steps - statistics.mean)**2).sum())
+        return statistics
+
+    def add(self, steps):
+        """Add the steps of more simulations, combining the mean and sum 
+        of squares of the new steps with the existing ones.
+        """
+        steps = np.asarray(steps, dtype=np.int64)
+        if len(steps) == 0:
+            return
+        n_runs = len(steps)
+        mean = steps.mean()
+        m2 = ((steps - mean)**2).sum()
+        total = self.n_runs + n_runs
+        delta = mean - self.mean
+        self.mean += delta * n_runs / total
+        self.m2 += m2 + delta**2 * self.n_runs * n_runs / total
+        self.n_runs = total
+
+        counts = np.bincount(steps)
+        if len(counts) > len(self.counts):
+            self.counts = np.pad(self.counts, 
+                                 (0, len(counts) - len(self.counts)))
+        self.counts[:len(counts)] += counts
+
+    @property
+    def std(self):
+        """The sample standard deviation of the steps."""
+        if self.n_runs < 2:
+            return np.inf
+        return np.sqrt(self.m2 / (self.n_runs - 1))
+
+    def histogram(self):
+        """Return arrays of each number of steps taken and the number of
+        simulations which took that many steps.
+        """
+        steps = np.flatnonzero(self.counts)
+        return steps, self.counts[steps]
+
+    def quantile(self, q):
+        """Return the q quantile of the steps, interpolating linearly 
+        between steps as numpy.quantile does.
+        """
+        cumulative = np.cumsum(self.counts)
+        position = q * (self.n_runs - 1)
+        below = np.searchsorted(cumulative, np.floor(position), side='right')
+        above = np.searchsorted(cumulative, np.ceil(position), side='right')
+        return below + (position - np.floor(position)) * (above - below)
+
+    def box(self):
+        """Return a dictionary of the quartiles and the fences of a box
+        plot of the steps, the most extreme steps within 1.5 times the 
+        interquartile range of the quartiles.
+        """
+        q1, median, q3 = (self.quantile(q) for q in (0.25, 0.5, 0.75))
+        steps = np.flatnonzero(self.counts)
+        iqr = q3 - q1
+        return {'q1': q1, 'median': median, 'q3': q3, 
+                'lowerfence': steps[steps >= q1 - 1.5 * iqr].min(),
+                'upperfence': steps[steps <= q3 + 1.5 * iqr].max()}
+
+    def summary(self, confidence=0.95):
+        """Return a dictionary of the number of simulations, the mean and 
+        standard deviation of the steps and the bounds of the confidence 
+        interval for the mean, using the t distribution.
+        """
+        from scipy import stats
+
+        half_width = (stats.t.ppf((1 + confidence) / 2, 
+                                  max(self.n_runs - 1, 1)) 
+                      * self.std / np.sqrt(self.n_runs))
+        return {'n_runs': self.n_runs, 'mean': float(self.mean), 
+                'std': float(self.std), 
+                'ci_low': float(self.mean - half_width), 
+                'ci_high': float(self.mean + half_width)}
+
+
+def sweep_path(output_dir, name, shared_door=False, aggregate=False):
+    """Return the path, without an extension, of the results of a sweep
+    saved under name in output_dir: '_shared_door' is added for sweeps
+    with a shared door and '_histogram' for aggregate sweeps.
+    """
+    path = os.path.join(output_dir, name)
+    if shared_door:
+        path += '_shared_door'
+    if aggregate:
+        path += '_histogram'
+    return path
+
+
+def simulate_block(task):
+    """Return a list of the steps taken in each simulation of a block of
+    replicates of one cell. The random number generator is reseeded with
+    the replicate's seed before each simulation.
+    """
+    rows, abreast, method, bag_percent, slow_average_fast, n_groups, \
+        engine, doors, shared_door, seeds = task
+    aero = Boarding(rows, abreast, method, bag_percent, slow_average_fast, 
+                    n_groups, engine=engine, doors=doors, 
+                    shared_door=shared_door)
+    results = []
+    for replicate_seed in seeds:
+        aero.seed(replicate_seed)
+        results.append(aero.return_steps())
+    return results
+
+
+def profile_block(task):
+    """Return the results of a simulate_block task, run with 
+    ProfiledBoarding, and the BoardingStats of all its simulations.
+    """
+    rows, abreast, method, bag_percent, slow_average_fast, n_groups, \
+        engine, doors, shared_door, seeds = task
+    aero = ProfiledBoarding(rows, abreast, method, bag_percent, 
+                            slow_average_fast, n_groups, engine=engine, 
+                            doors=doors, shared_door=shared_door)
+    results = []
+    stats = BoardingStats()
+    for replicate_seed in seeds:
+        aero.seed(replicate_seed)
+        results.append(aero.return_steps())
+        stats.merge(aero.stats)
+    return results, stats
+
+
+class ResultCache:
+    """Class to keep the results of blocks of simulations on disk so they
+    are loaded rather than simulated when a sweep is run again. Each block
+    is stored in a file named by a hash of its parameters, its random 
+    seeds and ENGINE_VERSION. The engine itself is not part of the key as
+    every engine gives the same results.
+
+    Arguments
+        path - the directory to keep the results in
+        max_bytes - the maximum total size of the stored results. The 
+                    least recently used results are removed once it is
+                    exceeded.
+    """
+    def __init__(self, path='data/cache', max_bytes=2**30):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self.entries())
+
+    def entries(self):
+        """Return a list of the DirEntry of each stored block."""
+        return [entry for entry in os.scandir(self.path) 
+                if entry.name.endswith('.npy')]
+
+    def file_path(self, task):
+        """Return the path of the file for a simulate_block task. Files
+        are prefixed with the engine version so stale results can be
+        found.
+        """
+        rows, abreast, method, bag_percent, slow_average_fast, n_groups, \
+            engine, doors, shared_door, seeds = task
+        key = (rows, abreast, method, bag_percent, slow_average_fast, 
+               n_groups, seeds, ENGINE_VERSION)
+        # Blocks boarded only through the front door, with a queue for 
+        # each aisle, keep the key they had before doors could be chosen.
+        if list(doors) != [1]:
+            key += (list(doors),)
+        if shared_door:
+            key += ('shared door',)
+        name = 'v{}-{}.npy'.format(ENGINE_VERSION, 
+                                   sha256(repr(key).encode()).hexdigest())
+        return os.path.join(self.path, name)
+
+    def load(self, task):
+        """Return the list of results for a task, or None if they have 
+        not been stored. A file which cannot be read, e.g. because it was
+        only partly written, is removed and treated as not stored.
+        """
+        path = self.file_path(task)
+        try:
+            results = np.load(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, zipfile.BadZipFile):
+            self.remove(path)
+            return None
+        # The modification time records when a block was last used.
+        os.utime(path)
+        return results.tolist()
+
+    def save(self, task, results):
+        """Store the list of results for a task, then remove the least
+        recently used results if the cache is too large.
+        """
+        path = self.file_path(task)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            np.save(f, np.asarray(results, dtype=np.int32))
+        if os.path.exists(path):
+            self.size -= os.path.getsize(path)
+        os.replace(temporary, path)
+        self.size += os.path.getsize(path)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def remove(self, path):
+        """Remove a stored block, if it is still there."""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self.size -= size
+
+    def evict(self):
+        """Remove the least recently used results until the cache is 
+        below three quarters of max_bytes.
+        """
+        entries = sorted(self.entries(), key=lambda e: e.stat().st_mtime)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.size <= 0.75 * self.max_bytes:
+                break
+            self.size -= entry.stat().st_size
+            os.remove(entry.path)
+
+    def invalidate(self):
+        """Remove results stored by other versions of the simulation."""
+        prefix = 'v{}-'.format(ENGINE_VERSION)
+        for entry in self.entries():
+            if not entry.name.startswith(prefix):
+                self.size -= entry.stat().st_size
+                os.remove(entry.path)
+
+    def clear(self):
+        """Remove all stored results."""
+        for entry in self.entries():
+            os.remove(entry.path)
+        self.size = 0
+
+
+class ResultBuffer:
+    """Class to collect simulation results in preallocated NumPy columns,
+    one row per simulation, and build a single DataFrame from them, which
+    is written out by ResultWriter.
+    
+    Arguments
+        columns - dictionary of column names and either a NumPy dtype or,
+                  for categorical columns, a list of the categories. 
+                  Categorical columns are stored as integer codes.
+        size - the number of rows to preallocate
+    """
+    def __init__(self, columns, size):
+        self.columns = columns
+        self.size = size
+        self.data = {}
+        for name, dtype in columns.items():
+            if isinstance(dtype, list):
+                dtype = np.int8 if len(dtype) < 128 else np.int16
+            self.data[name] = np.empty(size, dtype=dtype)
+        self.n_rows = 0
+
+    def add(self, steps, **values):
+        """Add the steps from the simulations of one cell, with the cell's
+        value for each of the other columns. Values given as a list have 
+        one element per simulation.
+        """
+        steps = np.asarray(steps, dtype=self.data['steps'].dtype)
+        if self.n_rows + len(steps) > self.size:
+            raise ValueError('ResultBuffer holds only {} rows'.format(
+                self.size))
+        rows = slice(self.n_rows, self.n_rows + len(steps))
+        self.data['steps'][rows] = steps
+        for name, value in values.items():
+            if isinstance(self.columns[name], list) and \
+                    not isinstance(value, list):
+                value = self.columns[name].index(value)
+            self.data[name][rows] = value
+        self.n_rows += len(steps)
+
+    def to_frame(self):
+        """Return the rows currently in the buffer as a DataFrame."""
+        import pandas as pd
+
+        df = pd.DataFrame()
+        for name, dtype in self.columns.items():
+            column = self.data[name][:self.n_rows]
+            if isinstance(dtype, list):
+                column = pd.Categorical.from_codes(column, dtype)
+            df[name] = column
+        return df
+
+
+class ResultWriter:
+    """Class to write the results of a sweep one cell at a time as each 
+    cell completes, with a json manifest of the completed cells so an 
+    interrupted sweep can be resumed.
+
+    Arguments
+        path - the output path without an extension. Csv results are 
+               appended to path + '.csv'. Parquet results are written to
+               the directory path + '.parquet', one file per cell, which 
+               can be read back with pd.read_parquet.
+        settings - dictionary of the sweep settings that are not part of
+                   the cells, e.g. rows and seed. Resuming a sweep with 
+                   different settings raises a ValueError. Settings given
+                   as None take their value from the manifest.
+        output_format - 'csv' or 'parquet'
+        compression - compression used for parquet files, e.g. 'snappy' 
+                      or 'zstd'
+        resume - if True, cells listed in an existing manifest are kept
+                 and only the remaining cells need to be written. 
+                 Otherwise any existing results are replaced.
+    """
+    def __init__(self, path, settings, output_format='csv', 
+                 compression='snappy', resume=False):
+        if output_format not in ('csv', 'parquet'):
+            raise ValueError("output_format must be 'csv' or 'parquet'")
+        self.path = path + '.' + output_format
+        self.manifest_path = path + '.manifest.json'
+        self.output_format = output_format
+        self.compression = compression
+
+        if resume and os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            self.check_manifest(settings)
+        else:
+            self.manifest = {'format': output_format, 'settings': settings,
+                             'completed': [], 'summaries': [], 'size': 0}
+            self.remove_results()
+        self.settings = self.manifest['settings']
+        self.completed = set(self.manifest['completed'])
+
+    def check_manifest(self, settings):
+        """Check the manifest matches this sweep and remove any results
+        written after the manifest was last saved.
+        """
+        if self.manifest['format'] != self.output_format:
+            raise ValueError('Sweep was saved as {}'.format(
+                self.manifest['format']))
+        for name, value in settings.items():
+            saved = self.manifest['settings'].get(name)
+            if value is not None and value != saved:
+                raise ValueError('Sweep was run with {}={}, not {}'.format(
+                    name, saved, value))
+
+        # A cell may have been partly written when the sweep stopped.
+        if self.output_format == 'csv' and os.path.exists(self.path):
+            if os.path.getsize(self.path) < self.manifest['size']:
+                raise ValueError('{} is shorter than its manifest'.format(
+                    self.path))
+            os.truncate(self.path, self.manifest['size'])
+        elif self.output_format == 'parquet' and os.path.exists(self.path):
+            n_parts = len(self.manifest['completed'])
+            for name in os.listdir(self.path):
+                if name >= self.part_name(n_parts):
+                    os.remove(os.path.join(self.path, name))
+
+    def remove_results(self):
+        """Remove the results and manifest of a previous sweep."""
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                os.remove(os.path.join(self.path, name))
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def part_name(self, number):
+        """Return the file name of the given parquet part."""
+        return 'part-{:05d}.parquet'.format(number)
+
+    def is_complete(self, cell):
+        """Return True if the results for the cell have been written."""
+        return repr(cell) in self.completed
+
+    def write(self, cell, df, summary):
+        """Write the results DataFrame for a cell and record the cell as
+        completed in the manifest, along with a dictionary summarising 
+        the cell's results.
+        """
+        if self.output_format == 'csv':
+            header = self.manifest['size'] == 0
+            df.to_csv(self.path, mode='w' if header else 'a', header=header,
+                      index=False)
+            self.manifest['size'] = os.path.getsize(self.path)
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            part = self.part_name(len(self.manifest['completed']))
+            df.to_parquet(os.path.join(self.path, part), index=False, 
+                          compression=self.compression)
+        self.manifest['completed'].append(repr(cell))
+        self.manifest['summaries'].append(summary)
+        self.completed.add(repr(cell))
+        self.save_manifest()
+
+    def save_summary(self, path):
+        """Save a csv file with the summary of each completed cell."""
+        import pandas as pd
+
+        pd.DataFrame(self.manifest['summaries']).to_csv(path, index=False)
+
+    def save_manifest(self):
+        """Save the manifest, replacing the old one only once the new one
+        has been written in full.
+        """
+        temporary = self.manifest_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(temporary, self.manifest_path)
 
 
 class Simulations:
@@ -21,106 +468,420 @@ class Simulations:
         - steps by boarding method
         - steps by number of boarding aisles
         - steps by number of boarding groups
+        - steps by boarding doors
+
+    The engine argument is one of the Boarding engines, 'scan', 'grid' 
+    or 'event'. n_runs is the number of simulations run for each 
+    combination of parameters (cell). The replicates of each cell are
+    split into blocks of chunk_size (all n_runs if None) which are run 
+    across n_workers processes. Each replicate has its own random seed
+    derived from seed, so results do not depend on n_workers or 
+    chunk_size. The seed is saved with each result, so a single 
+    replicate can be rerun with Boarding(..., seed=seed).return_steps().
+    
+    The results of each cell are written as soon as the cell completes, 
+    as csv or, with output_format='parquet', as typed and compressed 
+    parquet files. If resume is True, an interrupted sweep carries on 
+    from the last completed cell, using the seed it was started with 
+    unless another seed is given.
+
+    If a ResultCache is given, blocks of replicates already in the cache
+    are loaded instead of simulated and new blocks are added to it. As 
+    the seeds depend on seed, the cache is only used by sweeps run with 
+    the same seed.
+
+    If ci_width is given, replicates are run in rounds of chunk_size 
+    (100 if None) for each cell until the confidence interval for the 
+    cell's mean steps is narrower than ci_width, or n_runs replicates 
+    have been run. The number of replicates, mean and confidence 
+    interval of each cell are saved to a summary csv file alongside the
+    results.
+
+    If aggregate is True, only a histogram of the steps of each cell is 
+    saved, as the number of simulations (count) taking each number of
+    steps, rather than one row per simulation. PlotSimulations can plot 
+    either.
+
+    Results are saved in output_dir.
+
+    If profile is True, every simulation is run with ProfiledBoarding
+    rather than loaded from the cache, and self.stats is a BoardingStats
+    of all simulations run by the sweep.
+
+    If shared_door is True, passengers wait in one queue at each door and
+    choose their aisle as they enter (see Boarding), and '_shared_door' 
+    is added to the names of the files saved.
     """
-    def __init__(self, rows, abreast, bag_percent, slow_average_fast):
+    def __init__(self, rows, abreast, bag_percent, slow_average_fast, 
+                 engine='scan', n_runs=1000, n_workers=1, chunk_size=None, 
+                 seed=None, output_format='csv', compression='snappy', 
+                 resume=False, cache=None, ci_width=None, confidence=0.95,
+                 aggregate=False, output_dir='data', profile=False, 
+                 shared_door=False):
         self.rows = rows
         self.abreast = abreast
         self.bag_percent = bag_percent
         self.slow_average_fast = slow_average_fast
+        self.engine = engine
+        self.n_runs = n_runs
+        self.n_workers = n_workers
+        if chunk_size is None:
+            chunk_size = n_runs if ci_width is None else min(100, n_runs)
+        self.chunk_size = chunk_size
+        self.random_seed = seed is None
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.output_format = output_format
+        self.compression = compression
+        self.resume = resume
+        self.cache = cache
+        self.ci_width = ci_width
+        self.confidence = confidence
+        self.aggregate = aggregate
+        self.output_dir = output_dir
+        self.profile = profile
+        self.shared_door = shared_door
+        self.stats = BoardingStats()
         self.methods = ['front-to-back', 'back-to-front', 'WMA', 
                         'front-to-back WMA', 'back-to-front WMA', 'random', 
                         'optimal']
 
+    # The name each sweep's results are saved under.
+    SWEEP_FILES = {'steps_by_method': 'by_method_data_additional',
+                   'steps_by_no_aisles': 'by_aisles_data',
+                   'steps_by_n_groups': 'by_number_groups_data',
+                   'steps_by_doors': 'by_doors_data'}
+
+    def run_cells(self, cells):
+        """Yield, for each cell in order, the results of the n_runs 
+        simulations of that cell from cell_results. Cells are tuples of 
+        (abreast, method, bag_percent, n_groups) with, optionally, the 
+        list of doors (the front door if not given).
+        """
+        if not cells:
+            return
+        tasks = []
+        for cell in cells:
+            for start in range(0, self.n_runs, self.chunk_size):
+                stop = min(start + self.chunk_size, self.n_runs)
+                tasks.append(self.create_task(cell, start, stop))
+
+        # Blocks are returned in the order of the tasks, so each cell's
+        # blocks are next to each other.
+        blocks_per_cell = len(tasks) // len(cells)
+        with self.create_executor() as executor:
+            blocks = self.run_tasks(tasks, executor)
+            yield from self.group_blocks(tasks, blocks, blocks_per_cell)
+
+    def run_cells_adaptive(self, cells):
+        """Yield the index of each cell, with the results of its 
+        simulations from cell_results, as each cell completes. Every cell
+        still running is given another chunk_size replicates in each
+        round, and completes once the confidence interval for its mean is
+        narrower than ci_width or it has run n_runs replicates. Which
+        cells complete in each round does not depend on n_workers.
+        """
+        results = [self.cell_results() for cell in cells]
+        running = list(range(len(cells)))
+        start = 0
+        with self.create_executor() as executor:
+            while running:
+                stop = min(start + self.chunk_size, self.n_runs)
+                tasks = [self.create_task(cells[i], start, stop) 
+                         for i in running]
+                for i, task, block in zip(running, tasks, 
+                                          self.run_tasks(tasks, executor)):
+                    self.add_block(results[i], task, block)
+                start = stop
+
+                still_running = []
+                for i in running:
+                    summary = results[i][2].summary(self.confidence)
+                    width = summary['ci_high'] - summary['ci_low']
+                    if stop == self.n_runs or width < self.ci_width:
+                        yield i, results[i]
+                        results[i] = None
+                    else:
+                        still_running.append(i)
+                running = still_running
+
+    def create_task(self, cell, start, stop):
+        """Return the simulate_block task for replicates start to 
+        stop - 1 of a cell.
+        """
+        abreast, method, bag_percent, n_groups, *doors = cell
+        doors = doors[0] if doors else [1]
+        seeds = replicate_seeds(self.seed, cell, start, stop)
+        return (self.rows, abreast, method, bag_percent, 
+                self.slow_average_fast, n_groups, self.engine, doors, 
+                self.shared_door, seeds)
+
+    def create_executor(self):
+        """Return a process pool to run the simulations in, or a context
+        giving None to run them in this process.
+        """
+        if self.n_workers == 1:
+            return nullcontext()
+        return ProcessPoolExecutor(self.n_workers)
+
+    def run_tasks(self, tasks, executor):
+        """Yield the results of each simulate_block task in order. Blocks
+        in the cache are loaded and the others are run in the executor.
+        """
+        if self.cache is None or self.profile:
+            cached = [None] * len(tasks)
+        else:
+            cached = [self.cache.load(task) for task in tasks]
+        missing = [task for task, block in zip(tasks, cached) 
+                   if block is None]
+        function = profile_block if self.profile else simulate_block
+        if executor is None:
+            computed = map(function, missing)
+        else:
+            computed = executor.map(function, missing)
+        if self.profile:
+            computed = self.merge_stats(computed)
+        yield from self.fill_blocks(missing, cached, computed)
+
+    def merge_stats(self, computed):
+        """Yield the results of each profiled block, adding its stats to
+        self.stats.
+        """
+        for results, stats in computed:
+            self.stats.merge(stats)
+            yield results
+
+    def fill_blocks(self, missing, cached, computed):
+        """Yield the results of each block in order, taking each block 
+        that was not cached from computed and adding it to the cache.
+        """
+        computed = zip(missing, computed)
+        for block in cached:
+            if block is None:
+                task, block = next(computed)
+                if self.cache is not None:
+                    self.cache.save(task, block)
+            yield block
+
+    def cell_results(self):
+        """Return the empty results of a cell: a list of the random seeds,
+        a list of the steps taken in each simulation and the 
+        StepStatistics of the steps. In aggregate mode only the 
+        statistics are kept and the seeds and steps are None.
+        """
+        if self.aggregate:
+            return None, None, StepStatistics()
+        return [], [], StepStatistics()
+
+    def add_block(self, results, task, block):
+        """Add the results of a simulate_block task to a cell's results."""
+        seeds, steps, statistics = results
+        statistics.add(block)
+        if not self.aggregate:
+            seeds += task[-1]
+            steps += block
+
+    def group_blocks(self, tasks, blocks, blocks_per_cell):
+        """Yield the combined results of each consecutive group of 
+        blocks_per_cell blocks.
+        """
+        results = self.cell_results()
+        for count, (task, block) in enumerate(zip(tasks, blocks), 1):
+            self.add_block(results, task, block)
+            if count % blocks_per_cell == 0:
+                yield results
+                results = self.cell_results()
+
+    def create_writer(self, path, sweep_settings):
+        """Return a ResultWriter for a sweep saved to path, with the 
+        settings every sweep shares and the sweep's own sweep_settings.
+        A resumed sweep takes its seed from the manifest unless a seed 
+        was given.
+        """
+        settings = {'rows': self.rows, 
+                    'slow_average_fast': self.slow_average_fast,
+                    'n_runs': self.n_runs, 'ci_width': self.ci_width,
+                    'confidence': self.confidence, 
+                    'chunk_size': self.chunk_size if self.ci_width else None,
+                    'seed': None if self.random_seed else self.seed}
+        settings.update(sweep_settings)
+        writer = ResultWriter(path, settings, self.output_format, 
+                              self.compression, self.resume)
+        if writer.settings['seed'] is None:
+            writer.settings['seed'] = self.seed
+            writer.save_manifest()
+        self.seed = writer.settings['seed']
+        return writer
+
+    def run_sweep(self, name, columns, cells, values, settings):
+        """Run the simulations of each cell not already completed and 
+        write the results of each cell to the file name in output_dir as
+        it completes. values is a list of dictionaries of the values of 
+        the other columns for each cell, and the file is named by 
+        sweep_path. In aggregate mode the seed column is replaced by a 
+        count column. settings is a dictionary of the arguments which 
+        are the same in every cell but are not written as a column, e.g.
+        abreast, so a sweep cannot be resumed with different values.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = sweep_path(self.output_dir, name, self.shared_door, 
+                          self.aggregate)
+        if self.aggregate:
+            columns = {name: dtype for name, dtype in columns.items() 
+                       if name != 'seed'}
+            columns['count'] = np.int32
+        writer = self.create_writer(path, settings)
+        todo = [i for i, cell in enumerate(cells) 
+                if not writer.is_complete(cell)]
+        todo_cells = [cells[i] for i in todo]
+        if self.ci_width is None:
+            results = enumerate(self.run_cells(todo_cells))
+        else:
+            results = self.run_cells_adaptive(todo_cells)
+        for j, (seeds, steps, statistics) in results:
+            i = todo[j]
+            if self.aggregate:
+                steps, counts = statistics.histogram()
+                buffer = ResultBuffer(columns, len(steps))
+                buffer.add(steps, count=counts.tolist(), **values[i])
+            else:
+                buffer = ResultBuffer(columns, len(steps))
+                buffer.add(steps, seed=seeds, **values[i])
+            summary = dict(values[i], **statistics.summary(self.confidence))
+            writer.write(cells[i], buffer.to_frame(), summary)
+        writer.save_summary(path + '_summary.csv')
+
     def steps_by_method(self):
-        """Save a csv file with the results from 1,000 simulations of 
-        each combination of method and bag percentage.
+        """Save the results from n_runs simulations of each combination 
+        of method and bag percentage.
         """
         bag_percentages = [0, .1, .2, .3, .4, .5, .6, .7, .8, .9, 1]
-        parameters = product(self.methods, bag_percentages)
+        parameters = list(product(self.methods, bag_percentages))
+        cells = [(self.abreast, method, bag_percent, self.rows) 
+                 for (method, bag_percent) in parameters]
+        values = [{'method': method, 'bag_percent': bag_percent} 
+                  for (method, bag_percent) in parameters]
         
-        df = pd.DataFrame()
-        for (method, bag_percent) in parameters:
-            aero = Boarding(self.rows, self.abreast, method, bag_percent, 
-                            self.slow_average_fast, self.rows)
-            results = [aero.return_steps() for _ in range(1000)]
-            df = df.append(
-                pd.DataFrame(
-                    {'method': method,
-                     'bag_percent': bag_percent,
-                     'steps': results}
-                ), 
-                ignore_index=True)
-        
-        df.to_csv('data/by_method_data_additional.csv', index=False)
+        columns = {'method': self.methods, 'bag_percent': np.float64, 
+                   'seed': np.uint32, 'steps': np.int16}
+        self.run_sweep(self.SWEEP_FILES['steps_by_method'], columns, cells, 
+                       values, {'abreast': self.abreast})
     
     def steps_by_no_aisles(self):
-        """Save a csv file with the results from 1,000 simulations of 
-        each combination of method and seating configuration.
+        """Save the results from n_runs simulations of each combination 
+        of method and seating configuration.
         """
         configurations = [[3,3], [2,2,2]]
-        parameters = product(self.methods, configurations)
-
-        df = pd.DataFrame()
+        parameters = list(product(self.methods, configurations))
+        cells = [(abreast, method, self.bag_percent, self.rows) 
+                 for (method, abreast) in parameters]
+        values = [{'method': method, 'configuration': str(abreast)} 
+                  for (method, abreast) in parameters]
 
-        for (method, abreast) in parameters:
-            aero = Boarding(self.rows, abreast, method, self.bag_percent, 
-                            self.slow_average_fast, self.rows)
-            results = [aero.return_steps() for _ in range(1000)]
-            df = df.append(
-                pd.DataFrame(
-                    {'method': method,
-                     'configuration': str(abreast),
-                     'steps': results}
-                ), 
-                ignore_index=True)
-
-        df.to_csv('data/by_aisles_data.csv', index=False)
+        columns = {'method': self.methods, 
+                   'configuration': [str(c) for c in configurations], 
+                   'seed': np.uint32, 'steps': np.int16}
+        self.run_sweep(self.SWEEP_FILES['steps_by_no_aisles'], columns, cells, 
+                       values, {'bag_percent': self.bag_percent})
     
     def steps_by_n_groups(self):
-        """Save a csv file with the results from 1,000 simulations of 
-        each combination of method, bag percentage and number of groups.
+        """Save the results from n_runs simulations of each combination 
+        of method, bag percentage and number of groups.
         """
         methods = ['front-to-back', 'back-to-front', 'front-to-back WMA', 
                    'back-to-front WMA']
         bag_percentages = [0, 0.5, 1]
         n_groups = [1, 5, 10, 15]
-        parameters = product(methods, bag_percentages, n_groups)
+        parameters = list(product(methods, bag_percentages, n_groups))
+        cells = [(self.abreast, method, bag_percent, n) 
+                 for (method, bag_percent, n) in parameters]
+        values = [{'method': method, 'bag_percent': bag_percent, 
+                   'n_groups': n} 
+                  for (method, bag_percent, n) in parameters]
 
-        df = pd.DataFrame()
+        columns = {'method': methods, 'bag_percent': np.float64, 
+                   'n_groups': np.int16, 'seed': np.uint32, 
+                   'steps': np.int16}
+        self.run_sweep(self.SWEEP_FILES['steps_by_n_groups'], columns, cells, 
+                       values, {'abreast': self.abreast})
 
-        for (method, bag_percent, n) in parameters:
-            aero = Boarding(self.rows, self.abreast, method, bag_percent, 
-                            self.slow_average_fast, n)
-            results = [aero.return_steps() for _ in range(1000)]
-            df = df.append(
-                pd.DataFrame(
-                    {
-                        'method': method,
-                        'bag_percent': bag_percent,
-                        'n_groups': n,
-                        'steps': results
-                    }
-                ), 
-                ignore_index=True)
-        
-        df.to_csv('data/by_number_groups_data.csv', index=False)
+    def steps_by_doors(self):
+        """Save the results from n_runs simulations of each combination 
+        of method and boarding doors: the front door only, or front and
+        rear doors with each passenger using the door nearest their row.
+        """
+        door_configurations = [[1], [1, self.rows]]
+        parameters = list(product(self.methods, door_configurations))
+        # Front door cells are left as in the other sweeps, so they have
+        # the same seeds and cached results.
+        cells = [(self.abreast, method, self.bag_percent, self.rows) 
+                 + ((doors,) if doors != [1] else ()) 
+                 for (method, doors) in parameters]
+        values = [{'method': method, 'doors': str(doors)} 
+                  for (method, doors) in parameters]
+
+        columns = {'method': self.methods, 
+                   'doors': [str(d) for d in door_configurations], 
+                   'seed': np.uint32, 'steps': np.int16}
+        self.run_sweep(self.SWEEP_FILES['steps_by_doors'], columns, cells, 
+                       values, {'abreast': self.abreast, 
+                                'bag_percent': self.bag_percent})
 
     
 class PlotSimulations:
     """Class with methods to read simulations data and produce charts to
-    summarise the data.
+    summarise the data. The data can either have one row per simulation
+    or, from an aggregate sweep, a count of the simulations taking each
+    number of steps.
     """
     def __init__(self, df):
         self.df = df
+        self.aggregated = 'count' in df.columns
         self.category_order = ['front-to-back', 'back-to-front', 'WMA', 
                                'front-to-back WMA', 'back-to-front WMA',
                                'random', 'optimal']
+
+    def cell_statistics(self, df, keys):
+        """Return a DataFrame with the number of simulations, mean, 
+        standard deviation, quartiles and box plot fences of the steps 
+        for each combination of the keys columns.
+        """
+        import pandas as pd
+
+        rows = []
+        for values, group in df.groupby(keys, observed=True):
+            if self.aggregated:
+                statistics = StepStatistics.from_histogram(group['steps'], 
+                                                           group['count'])
+            else:
+                statistics = StepStatistics(group['steps'])
+            rows.append(dict(zip(keys, values), **statistics.summary(), 
+                             **statistics.box()))
+        return pd.DataFrame(rows)
+
+    def box(self, df, x, **kwargs):
+        """Return a box plot trace of the steps in df for each value of 
+        the column x. Aggregated data is drawn from its quartiles and 
+        fences.
+        """
+        import plotly.graph_objects as go
+
+        if not self.aggregated:
+            return go.Box(x=list(df[x]), y=list(df['steps']), **kwargs)
+        df = self.cell_statistics(df, [x]).sort_values('median')
+        return go.Box(x=list(df[x]), q1=list(df['q1']), 
+                      median=list(df['median']), q3=list(df['q3']),
+                      lowerfence=list(df['lowerfence']), 
+                      upperfence=list(df['upperfence']), **kwargs)
         
     def plot_steps_by_method(self, filename):
         """Plot a boxplot summarising the mean number of steps taken 
         for different boarding methods with different passenger bag 
         percentages and save as a png file.
         """
+        import plotly.graph_objects as go
+
         df = self.df.copy()
         df = df.sort_values('steps')
         
@@ -132,9 +893,8 @@ class PlotSimulations:
 
         for percent, colour in zip(bag_percentages, colours):
             fig.add_trace(
-                go.Box(
-                    x=list(df[df['bag_percent'] == percent]['method']),
-                    y=list(df[df['bag_percent'] == percent]['steps']),
+                self.box(
+                    df[df['bag_percent'] == percent], 'method',
                     marker=dict(color=colour),
                     name=str(int(percent*100)),
                     hoverinfo='skip'
@@ -176,27 +936,43 @@ class PlotSimulations:
         for different boarding methods with seatin configurations and 
         save as a png file.
         """
-        df = self.df
-        df = (df.groupby(['configuration', 'method'], as_index=False)
-              .agg({'steps': ['mean', 'std']})
-             )
+        self.plot_mean_steps(filename, 'configuration', 
+                             'each seating arrangement', 'Seating arrangement')
+
+    def plot_steps_by_doors(self, filename):
+        """Plot a bar chart summarising the mean number of steps taken 
+        for different boarding methods boarding through the front door
+        only or through front and rear doors and save as a png file.
+        """
+        self.plot_mean_steps(filename, 'doors', 'each set of doors', 
+                             'Door rows')
+
+    def plot_mean_steps(self, filename, column, subtitle, legend):
+        """Plot a bar chart of the mean number of steps taken for each
+        boarding method, with a bar for each value of column, and save as
+        a png file. subtitle completes 'simulations were run for' and 
+        legend is the title of the legend.
+        """
+        import plotly.graph_objects as go
+
+        df = self.cell_statistics(self.df, [column, 'method'])
         
         colours = ['rgba(0,63,92,{})', 'rgba(255,166,0,{})']
         
         fig = go.Figure()
         
-        for config, colour in zip(df['configuration'].unique(), colours):
+        for config, colour in zip(df[column].unique(), colours):
             fig.add_trace(
                 go.Bar(
-                    x=list(df[df['configuration'] == config]['method']),
-                    y=list(df[df['configuration'] == config][('steps', 'mean')]),
+                    x=list(df[df[column] == config]['method']),
+                    y=list(df[df[column] == config]['mean']),
                     marker=dict(
                         color=colour.format(0.7), 
                         line=dict(color=colour.format(1), width=2)
                     ),
                     name=str(config).replace('[', '').replace(']', ''),
                     error_y=dict(
-                        array=list(df[df['configuration'] == config][('steps', 'std')])
+                        array=list(df[df[column] == config]['std'])
                     )
                 )
             )
@@ -206,9 +982,9 @@ class PlotSimulations:
             bargroupgap=0.05,
             title=("Mean Steps to Board a Plane by Boarding Method<br><sub>"
                    "For each boarding method, 1,000 simulations were run for "
-                   "each seating arrangement.<br>Error bars show the standard "
+                   + subtitle + ".<br>Error bars show the standard "
                    "deviation."), 
-            legend=dict(title="Seating arrangement"),
+            legend=dict(title=legend),
             xaxis=dict(
                 linewidth=2, 
                 linecolor='rgb(80,80,80)',
@@ -234,6 +1010,8 @@ class PlotSimulations:
         for different boarding methods with different numbers of groups 
         and passenger bag percentages and save as a png file.
         """
+        from plotly.subplots import make_subplots
+
         df = self.df
         df = df.sort_values(['n_groups', 'bag_percent'])
         df['bag_percent']  = [int(n * 100) for n in df['bag_percent']]
@@ -255,9 +1033,8 @@ class PlotSimulations:
             for percent, colour, offset in zip(df['bag_percent'].unique(), 
                                                colours, offsets):
                 fig.add_trace(
-                    go.Box(
-                        x=list(plot[plot['bag_percent'] == percent]['n_groups']),
-                        y=list(plot[plot['bag_percent'] == percent]['steps']),
+                    self.box(
+                        plot[plot['bag_percent'] == percent], 'n_groups',
                         marker=dict(color=colour),
                         name=str(percent),
                         hoverinfo='skip',
@@ -313,6 +1090,9 @@ class PlotSimulations:
         
     def plot_regression_by_method(self, filename):
         """"""
+        import plotly.graph_objects as go
+        import statsmodels.formula.api as smf
+
         df = self.df
         df['bag_percent'] = df['bag_percent'] * 100
         colours = ['red', 'green', 'blue', 'orange', 'lightblue', 'pink', 
@@ -322,10 +1102,16 @@ class PlotSimulations:
 
         for count, (method, colour) in enumerate(zip(self.category_order, colours)):
             data = df[df['method'] == method].copy()
-            results = smf.ols('steps ~ bag_percent', data).fit()
+            # Weighting each number of steps by its count gives the same
+            # fit as the simulations it summarises.
+            if self.aggregated:
+                results = smf.wls('steps ~ bag_percent', data, 
+                                  weights=data['count']).fit()
+            else:
+                results = smf.ols('steps ~ bag_percent', data).fit()
             r_2 = results.rsquared
-            m = results.params[1]
-            c = results.params[0]
+            m = results.params['bag_percent']
+            c = results.params['Intercept']
 
             fig.add_trace(
                 go.Scatter(
@@ -398,9 +1184,11 @@ class PlotSimulations:
         
     def plot_std_by_method(self, filename):
         """"""
-        df = (self.df
-              .groupby(['method', 'bag_percent'], as_index=False)['steps']
-              .std())
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+
+        df = self.cell_statistics(self.df, ['method', 'bag_percent'])
+        df = df.sort_values(['method', 'bag_percent'])
         df['bag_percent'] = df['bag_percent'] * 100
 
         methods = ['front-to-back', 'back-to-front', 'front-to-back WMA', 
@@ -415,7 +1203,7 @@ class PlotSimulations:
             fig.add_trace(
                 go.Bar(
                     x=list(df[df['method'] == method]['bag_percent']),
-                    y=list(df[df['method'] == method]['steps']),
+                    y=list(df[df['method'] == method]['std']),
                     marker=dict(
                         color=colour, 
                         opacity=0.8, 
@@ -483,31 +1271,44 @@ def main():
     initiate the PlotSimulations class and run the appropriate method to 
     produce a chart summarising the simulations data.
     """
+    import pandas as pd
+
     sim_or_plot = input("simulate or plot?")
     
     if sim_or_plot == 'simulate':
         output = input(("Choose one of: 'by method', 'by aisles', "
-                        "'by number groups'"))
+                        "'by number groups', 'by doors'"))
         rows = int(input("Number of rows: "))
         abreast= literal_eval(input("Seats per row: "))
         bag_percent = float(input("Bag percentage: "))
         slow_average_fast = literal_eval(
             input("Proportions of slow, average, fast passengers: "))
+        engine = input("Engine ('scan', 'grid' or 'event'): ")
+        n_workers = int(input("Number of worker processes: "))
+        output_format = input("Output format ('csv' or 'parquet'): ")
+        resume = input("Resume an interrupted sweep? (y/n) ") == 'y'
+        cache_path = input("Cache directory (blank for no cache): ")
+        cache = ResultCache(cache_path) if cache_path else None
         
-        aero = Simulations(rows, abreast, bag_percent, slow_average_fast)
+        aero = Simulations(rows, abreast, bag_percent, slow_average_fast, 
+                           engine, n_workers=n_workers, 
+                           output_format=output_format, resume=resume,
+                           cache=cache)
         if output == 'by method':
             aero.steps_by_method()
         elif output == 'by aisles':
             aero.steps_by_no_aisles()
         elif output == 'by number groups':
             aero.steps_by_n_groups()
+        elif output == 'by doors':
+            aero.steps_by_doors()
         else:
             print("Invalid choice")
     
     elif sim_or_plot == 'plot':
         output = input(("Choose one of: 'by method', 'by aisles', "
-                        "'by number groups', 'regression by method', "
-                        "'std by method'"))
+                        "'by number groups', 'by doors', "
+                        "'regression by method', 'std by method'"))
         filename = input("Filename: ")
         if output == 'by method':
             df = pd.read_csv('data/by_method_data.csv')
@@ -521,6 +1322,10 @@ def main():
             df = pd.read_csv('data/by_number_groups_data.csv')
             aero = PlotSimulations(df)
             aero.plot_steps_by_n_groups(filename)
+        elif output == 'by doors':
+            df = pd.read_csv('data/by_doors_data.csv')
+            aero = PlotSimulations(df)
+            aero.plot_steps_by_doors(filename)
         elif output == 'regression by method':
             df = pd.read_csv('data/by_method_data.csv')
             aero = PlotSimulations(df)
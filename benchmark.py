@@ -0,0 +1,260 @@
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter, strftime
+import tracemalloc
+
+from boarding_simulator import Boarding
+from continuous_simulator import ContinuousBoarding
+
+METHODS = ['front-to-back', 'back-to-front', 'WMA', 'front-to-back WMA', 
+           'back-to-front WMA', 'random', 'optimal']
+
+
+def time_engine(rows, abreast, engine, method, runs, base_seed):
+    """Return the mean time in seconds of one boarding run and the list
+    of steps taken for each run. Each run is given its own seed so 
+    different engines board identical planes.
+    """
+    steps = []
+    start = perf_counter()
+    for run in range(runs):
+        aero = Boarding(rows, abreast, method, 0.7, [0.2, 0.6, 0.2], rows,
+                        engine=engine, seed=base_seed + run)
+        steps.append(aero.return_steps())
+    return (perf_counter() - start) / runs, steps
+
+
+def benchmark_engines(sizes, configurations, engines, method, runs, 
+                      base_seed):
+    """Print the mean time per boarding run for each engine for each 
+    combination of plane size and seating configuration, along with the
+    speedup of each engine over the first.
+    """
+    header = '{:>5}  {:<12}'.format('rows', 'abreast')
+    for engine in engines:
+        header += '{:>11}'.format(engine + ' (s)')
+    for engine in engines[1:]:
+        header += '{:>9}'.format(engine)
+    print(header)
+    for abreast in configurations:
+        for rows in sizes:
+            times = []
+            results = []
+            for engine in engines:
+                time, steps = time_engine(rows, abreast, engine, method, runs, 
+                                          base_seed)
+                times.append(time)
+                results.append(steps)
+            if any(steps != results[0] for steps in results):
+                raise RuntimeError('Engines disagree for {} rows, {}'.format(
+                    rows, abreast))
+            line = '{:>5}  {:<12}'.format(rows, str(abreast))
+            for time in times:
+                line += '{:>11.3f}'.format(time)
+            for time in times[1:]:
+                line += '{:>8.1f}x'.format(times[0] / time)
+            print(line)
+
+
+def time_import(module, runs):
+    """Return the mean time in seconds to import a module in a new 
+    Python process, not counting the start up of the interpreter, and a 
+    list of the plotting and statistics libraries it loaded.
+    """
+    code = ('import sys, time\n'
+            'start = time.perf_counter()\n'
+            'import {}\n'
+            'print(time.perf_counter() - start)\n'
+            'heavy = ["matplotlib", "pandas", "plotly", "scipy", '
+            '"statsmodels"]\n'
+            'print(" ".join(m for m in heavy if m in sys.modules))')
+    total = 0
+    for run in range(runs):
+        output = subprocess.run([sys.executable, '-c', code.format(module)],
+                                capture_output=True, text=True, check=True)
+        time, loaded = (output.stdout.split('\n') + [''])[:2]
+        total += float(time)
+    return total / runs, loaded.split()
+
+
+def benchmark_imports(modules, runs):
+    """Print the mean time to import each module and the heavy libraries
+    it loads.
+    """
+    print('{:<25}{:>10}  {}'.format('module', 'time (s)', 'loads'))
+    for module in modules:
+        time, loaded = time_import(module, runs)
+        print('{:<25}{:>10.3f}  {}'.format(module, time, 
+                                          ', '.join(loaded) or '-'))
+
+
+def measure(function, runs, count=1):
+    """Return a dictionary of the mean time in seconds of a call to 
+    function over runs calls, the number of items per second (count 
+    items per call, e.g. boardings) and the peak memory in bytes of one
+    further call traced with tracemalloc.
+    """
+    start = perf_counter()
+    for run in range(runs):
+        function(run)
+    seconds = (perf_counter() - start) / runs
+
+    tracemalloc.start()
+    function(runs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': seconds, 'per_second': count / seconds, 
+            'peak_bytes': peak}
+
+
+def benchmark_suite(sizes, configurations, engine, runs, base_seed, 
+                    cell_runs=100):
+    """Return a dictionary of named measurements of creating passengers
+    and boarding for each method, plane size and seating configuration, 
+    continuous time boarding for each plane size and seating 
+    configuration, one Simulations cell of cell_runs simulations, 
+    plotting the boarding order and creating GIFs.
+    """
+    from analysis import Simulations
+
+    results = {}
+
+    def record(name, function, runs, count=1):
+        results[name] = measure(function, runs, count)
+        print('{:<66}{:>10.4f} s{:>12.1f}/s{:>10.0f} KB'.format(
+            name, results[name]['seconds'], results[name]['per_second'], 
+            results[name]['peak_bytes'] / 2**10))
+
+    for abreast in configurations:
+        for rows in sizes:
+            for method in METHODS:
+                aero = Boarding(rows, abreast, method, 0.7, [0.2, 0.6, 0.2],
+                                rows, engine=engine)
+
+                def create(run):
+                    aero.seed(base_seed + run)
+                    aero.create_passengers()
+
+                def board(run):
+                    aero.seed(base_seed + run)
+                    aero.return_steps()
+
+                name = '{} rows={} abreast={} method={}'.format(
+                    '{}', rows, abreast, method)
+                record(name.format('create_passengers'), create, runs)
+                record(name.format('return_steps'), board, runs)
+
+            continuous = ContinuousBoarding(rows, abreast, 'random', 0.7, 
+                                            [0.2, 0.6, 0.2], rows)
+
+            def board_continuous(run):
+                continuous.seed(base_seed + run)
+                continuous.return_times()
+
+            record('ContinuousBoarding rows={} abreast={}'.format(
+                rows, abreast), board_continuous, runs)
+
+    # One cell of a sweep, run in this process.
+    aero = Simulations(30, [3, 3], 0.7, [0.2, 0.6, 0.2], engine, 
+                       n_runs=cell_runs, seed=base_seed)
+    cell = ([3, 3], 'random', 0.7, 30)
+    record('sweep cell rows=30 abreast=[3, 3] runs={}'.format(cell_runs),
+           lambda run: list(aero.run_cells([cell])), 1, cell_runs)
+
+    with TemporaryDirectory() as directory:
+        aero = Boarding(30, [3, 3], 'random', 0.7, [0.2, 0.6, 0.2], 30, 
+                        engine=engine, seed=base_seed)
+        path = os.path.join(directory, 'order.png')
+        record('plot_boarding_order rows=30 abreast=[3, 3]', 
+               lambda run: aero.plot_boarding_order(path, 100), 1)
+        path = os.path.join(directory, 'boarding.gif')
+        record('create_GIF raster rows=30 abreast=[3, 3]',
+               lambda run: aero.create_GIF(100, path, renderer='raster'), 1)
+        aero = Boarding(10, [3, 3], 'random', 0.7, [0.2, 0.6, 0.2], 10, 
+                        engine=engine, seed=base_seed)
+        record('create_GIF matplotlib rows=10 abreast=[3, 3]',
+               lambda run: aero.create_GIF(50, path), 1)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print the ratio of the time of each measurement to its time in 
+    the baseline and return a list of the names of measurements more 
+    than tolerance (e.g. 0.2 for 20%) slower than the baseline.
+    """
+    regressions = []
+    print('{:<66}{:>10}'.format('measurement', 'vs base'))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['seconds'] / baseline[name]['seconds']
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = '  slower'
+        print('{:<66}{:>9.2f}x{}'.format(name, ratio, flag))
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the simulation engines.')
+    parser.add_argument('--rows', type=int, nargs='+',
+                        help='default: 10 20 30, or 10 30 60 100 for --suite')
+    parser.add_argument('--method', default='random')
+    parser.add_argument('--engines', nargs='+', 
+                        default=['scan', 'grid', 'event'])
+    parser.add_argument('--engine', default='event', 
+                        help='engine used by --suite')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--cell-runs', type=int, default=100,
+                        help='simulations in the sweep cell of --suite')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--imports', action='store_true',
+                        help='time importing the modules instead')
+    parser.add_argument('--suite', action='store_true',
+                        help='run the full benchmark suite instead')
+    parser.add_argument('--save', help='json file to save suite results to')
+    parser.add_argument('--baseline', 
+                        help='json file of suite results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.suite:
+        sizes = args.rows or [10, 30, 60, 100]
+        configurations = [[3,3], [2,2,2], [3,4,3]]
+        results = benchmark_suite(sizes, configurations, args.engine, 
+                                  args.runs, args.seed, args.cell_runs)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump({'date': strftime('%Y-%m-%d %H:%M:%S'),
+                           'python': platform.python_version(),
+                           'platform': platform.platform(),
+                           'results': results}, f, indent=1)
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)['results']
+            regressions = compare(results, baseline, args.tolerance)
+            if regressions:
+                sys.exit('{} measurements slower than the baseline'.format(
+                    len(regressions)))
+        return
+
+    if args.imports:
+        modules = ['boarding_simulator', 'analysis', 'matplotlib.pyplot', 
+                   'pandas', 'plotly.graph_objects', 
+                   'statsmodels.formula.api']
+        benchmark_imports(modules, args.runs)
+        return
+
+    configurations = [[3,3], [2,2,2], [3,4,3]]
+    benchmark_engines(args.rows or [10, 20, 30], configurations, 
+                      args.engines, args.method, args.runs, args.seed)
+
+
+if __name__ == "__main__":
+    main()
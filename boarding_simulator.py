@@ -1,14 +1,164 @@
 from ast import literal_eval
-from copy import deepcopy
+from bisect import bisect_right, insort
+from collections import deque
+from heapq import heapify, heappop, heappush
 from itertools import product
-from random import choice, shuffle
+from random import Random
 from math import ceil, floor
+from types import MappingProxyType
 
-from matplotlib.animation import FuncAnimation, PillowWriter
-import matplotlib.pyplot as plt
 import numpy as np
 
 
+# Increase whenever a change to the simulation changes the number of 
+# steps taken for a given seed, so cached results are not reused.
+ENGINE_VERSION = 2
+
+
+class Passenger:
+    """Class holding the state of one passenger. __slots__ keeps each 
+    passenger small and the position is held as two integers, so no 
+    tuples are created as passengers move.
+    
+    Attributes
+        target - the passenger's seat as a tuple (e.g. (1,2))
+        row - the row the passenger is currently in (0 if either not yet 
+              on the plane or already seated)
+        aisle - the aisle the passenger is currently in
+        seated - whether the passenger is seated or not yet
+        bag_countdown - the number of steps left to put the bag away
+        door - the row the passenger enters the plane at
+
+    For code written for the earlier dictionary of passengers, 
+    passenger['target'] etc. can still be used, with 'position' giving
+    (row, aisle).
+    """
+    __slots__ = ('target', 'row', 'aisle', 'seated', 'bag_countdown', 
+                 'door')
+
+    def __init__(self, target, row, aisle, seated=False, bag_countdown=0, 
+                 door=1):
+        self.target = target
+        self.row = row
+        self.aisle = aisle
+        self.seated = seated
+        self.bag_countdown = bag_countdown
+        self.door = door
+
+    @property
+    def position(self):
+        return (self.row, self.aisle)
+
+    @position.setter
+    def position(self, position):
+        self.row, self.aisle = position
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def copy(self):
+        """Return a copy of the passenger."""
+        return Passenger(self.target, self.row, self.aisle, self.seated, 
+                         self.bag_countdown, self.door)
+
+
+def as_dict(plane):
+    """Return a list of passengers as the dictionary of dictionaries used
+    by earlier versions of Boarding, keyed by passenger number.
+    """
+    return {number: {'target': p.target, 'position': p.position, 
+                     'seated': p.seated, 'bag_countdown': p.bag_countdown}
+            for number, p in enumerate(plane)}
+
+
+class PlaneLayout:
+    """Class holding the parts of a plane's layout which are the same for
+    every boarding of a plane with a given number of rows and seating
+    arrangement. Layouts are immutable and should be created with 
+    PlaneLayout.get, which returns the same object for the same rows and
+    abreast.
+    
+    Attributes
+        seats - the seat numbers across a row, aisles excluded
+        aisles - the aisle numbers across a row
+        aisle_order - the seats ordered from those furthest from an 
+                      aisle (window) to those next to an aisle
+        aisle_rank - dictionary of each seat's index in aisle_order
+        nearest_aisles - dictionary of the aisles closest to each seat
+        bordering_aisles - dictionary of the aisles either side of the 
+                           block of seats each seat is in
+        blocked - dictionary with (seat, aisle) keys of the seats a 
+                  passenger must pass to get from the aisle to the seat
+        passenger_seats - (row, seat) coordinates of every seat on the 
+                          plane, by row and then seat
+    """
+    _cache = {}
+
+    def __init__(self, rows, abreast):
+        seats = list(range(1, sum(abreast) + len(abreast)))
+        count = 0
+        aisles = []
+        for a in abreast[:-1]:
+            count += a
+            aisles.append(seats[count])
+            del seats[count]
+
+        # Order of aisles by proximity to middle aisle
+        seat_distances = {seat: min(abs(seat - aisle) for aisle in aisles) 
+                          for seat in seats}
+        aisle_order = sorted(seats, key=lambda x: seat_distances[x], 
+                             reverse=True)
+
+        nearest_aisles = {
+            seat: tuple(aisle for aisle in aisles 
+                        if abs(seat - aisle) == seat_distances[seat])
+            for seat in seats
+        }
+        bordering_aisles = {}
+        for seat in seats:
+            below = [aisle for aisle in aisles if aisle < seat]
+            above = [aisle for aisle in aisles if aisle > seat]
+            bordering_aisles[seat] = tuple(below[-1:] + above[:1])
+        blocked = {}
+        for seat, aisle in product(seats, aisles):
+            if seat > aisle:
+                blocked[(seat, aisle)] = tuple(range(aisle + 1, seat))
+            else:
+                blocked[(seat, aisle)] = tuple(range(seat + 1, aisle))
+
+        set_attribute = super().__setattr__
+        set_attribute('rows', rows)
+        set_attribute('abreast', tuple(abreast))
+        set_attribute('seats', tuple(seats))
+        set_attribute('aisles', tuple(aisles))
+        set_attribute('aisle_order', tuple(aisle_order))
+        set_attribute('aisle_rank', MappingProxyType(
+            {seat: rank for rank, seat in enumerate(aisle_order)}))
+        set_attribute('nearest_aisles', MappingProxyType(nearest_aisles))
+        set_attribute('bordering_aisles', 
+                      MappingProxyType(bordering_aisles))
+        set_attribute('blocked', MappingProxyType(blocked))
+        set_attribute('passenger_seats', 
+                      tuple(product(range(1, rows + 1), seats)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PlaneLayout is immutable')
+
+    @classmethod
+    def get(cls, rows, abreast):
+        """Return the layout for a plane with the given number of rows 
+        and seating arrangement, creating it only the first time it is 
+        asked for.
+        """
+        key = (rows, tuple(abreast))
+        if key not in cls._cache:
+            cls._cache[key] = cls(rows, abreast)
+        return cls._cache[key]
+
+
 class Boarding:
     """Class to simulate the boarding of a plane using different
     boarding methods and produce a GIF to animate the boarding process.
@@ -47,10 +197,53 @@ class Boarding:
                            slow, medium and fast at boarding. 
                            e.g. [0.2, 0.4, 0.4]
         n_groups - the number of groups in which passengers board.
+        engine - how aisle occupancy is checked when a passenger tries to
+                 move along the aisle. All engines give identical results.
+            scan - build a list of every passenger's position for each 
+                   check
+            grid - keep a grid of the number of passengers in each row 
+                   of each aisle, updated as passengers move
+            event - as grid, but passengers are only updated when 
+                    something can change for them: the row ahead 
+                    becoming free, their bag being put away, or being 
+                    moved back into the aisle. Steps where nothing 
+                    happens are skipped.
+        seed - a seed for the random number generator, or a random.Random
+               instance to use. All random choices are made with this 
+               generator, so the same seed gives the same boardings.
+        doors - list of the rows at which passengers enter the plane,
+                e.g. [1, rows] for front and rear doors. [1] (the front)
+                if None. Each passenger uses the door nearest their row,
+                chosen at random if two are equally near, and walks 
+                along the aisle away from it towards their row, so 
+                passengers from different doors never need to pass each
+                other.
+        shared_door - if True, the passengers of each door wait in one 
+                      queue for every aisle and enter in boarding order,
+                      at most one per step through each door. On 
+                      entering, a passenger whose seat is between two 
+                      aisles takes whichever has the fewest passengers 
+                      in it plus seats to pass to reach theirs, of those
+                      whose first row is free. Otherwise (the default)
+                      each aisle has its own queue and passengers enter
+                      the aisle chosen for them before boarding. As only
+                      one passenger enters a step rather than one per 
+                      aisle, boarding planes with two or more aisles 
+                      takes up to twice as many steps, so results are 
+                      not comparable with those of separate queues.
     """
     
     def __init__(self, rows, abreast, method, bag_percent, slow_average_fast, 
-                 n_groups):
+                 n_groups, engine='scan', seed=None, doors=None, 
+                 shared_door=False):
+        if engine not in ('scan', 'grid', 'event'):
+            raise ValueError("engine must be one of 'scan', 'grid' or "
+                             "'event'")
+        if doors is None:
+            doors = [1]
+        if not doors or any(not 1 <= door <= rows for door in doors):
+            raise ValueError('doors must be rows between 1 and {}'.format(
+                rows))
         self.rows = rows
         self.abreast = abreast
         self.method = method
@@ -58,6 +251,33 @@ class Boarding:
         self.slow_percent = slow_average_fast[0]
         self.fast_percent = slow_average_fast[2]
         self.n_groups = n_groups
+        self.engine = engine
+        self.shared_door = shared_door
+        self.record = None
+        self.n_seated = 0
+        self.active = []
+        self.next_active = []
+        self.layout = PlaneLayout.get(rows, abreast)
+        self.aisles = list(self.layout.aisles)
+        self.seats = list(self.layout.seats)
+        self.aisle_order = list(self.layout.aisle_order)
+        self.doors = sorted(set(doors))
+        # The doors closest to each row (index 0 is unused).
+        self.nearest_doors = [()]
+        for row in range(1, rows + 1):
+            distance = min(abs(row - door) for door in self.doors)
+            self.nearest_doors.append(tuple(
+                door for door in self.doors if abs(row - door) == distance))
+        if isinstance(seed, Random):
+            self.rng = seed
+        else:
+            self.rng = Random(seed)
+
+    def seed(self, seed):
+        """Reseed the random number generator, e.g. to start an 
+        independent stream for each replicate of a simulation.
+        """
+        self.rng.seed(seed)
         
     def boarding_method(self, passengers):
         """Sort the list of passengers according to the specified 
@@ -65,51 +285,60 @@ class Boarding:
         passenger list is created from scratch.
         """
         if self.method == 'random':
-            shuffle(passengers)
+            self.rng.shuffle(passengers)
         elif self.method == 'back-to-front':
-            shuffle(passengers)
+            self.rng.shuffle(passengers)
             passengers.sort(key=lambda a: a[0], reverse=True)
             passengers = self.group_back_front(passengers)
         elif self.method == 'front-to-back':
-            shuffle(passengers)
+            self.rng.shuffle(passengers)
             passengers.sort(key=lambda a: a[0], reverse=False)
             passengers = self.group_back_front(passengers)
         elif self.method == 'WMA':
-            shuffle(passengers)
-            passengers.sort(key=lambda a: self.aisle_order.index(a[1]), 
-                            reverse=False)
+            self.rng.shuffle(passengers)
+            aisle_rank = self.layout.aisle_rank
+            passengers.sort(key=lambda a: aisle_rank[a[1]], reverse=False)
         elif self.method == 'front-to-back WMA':
             return self.group_WMA()
         elif self.method == 'back-to-front WMA':
             return self.group_WMA()
         elif self.method == 'optimal':
-            passengers.sort(
-                key=lambda a: [self.aisle_order[::-1].index(a[1]), a[0]], 
-                reverse=True)
+            # Window to aisle seats, rear to front within each.
+            aisle_rank = self.layout.aisle_rank
+            passengers.sort(key=lambda a: (aisle_rank[a[1]], -a[0]))
         return passengers
     
     
     def set_boarding_aisles(self, passengers):
         """Return a list which contains the boarding aisles for each
-        passenger. For each passenger, the distance to each aisle is 
-        calculated. If the minimum distance occurs once, the closest 
-        aisle is assigned as the boarding aisle. If the minimum distance 
-        occurs more than once, the boarding aisle is chosen at random 
-        from the closest aisles.
+        passenger. If one aisle is closest to the passenger's seat, it is
+        assigned as the boarding aisle. If more than one aisle is 
+        closest, the boarding aisle is chosen at random from the closest
+        aisles.
         """
+        nearest_aisles = self.layout.nearest_aisles
         boarding_aisles = []
         for p in passengers:
-            distances = [abs(p[1] - aisle) for aisle in self.aisles]
-            min_distance = min(distances)
-            if distances.count(min_distance) == 1:
-                boarding_aisles.append(
-                    (0, self.aisles[distances.index(min_distance)])
-                )
+            min_aisles = nearest_aisles[p[1]]
+            if len(min_aisles) == 1:
+                boarding_aisles.append(min_aisles[0])
             else:
-                min_aisles = [self.aisles[i] for i in range(len(self.aisles)) 
-                              if distances[i] == min_distance]
-                boarding_aisles.append((0, choice(min_aisles)))
+                boarding_aisles.append(self.rng.choice(min_aisles))
         return boarding_aisles
+
+    def set_boarding_doors(self, passengers):
+        """Return a list of the door each passenger enters the plane at,
+        the door closest to their row, chosen at random if more than one
+        door is closest.
+        """
+        boarding_doors = []
+        for p in passengers:
+            min_doors = self.nearest_doors[p[0]]
+            if len(min_doors) == 1:
+                boarding_doors.append(min_doors[0])
+            else:
+                boarding_doors.append(self.rng.choice(min_doors))
+        return boarding_doors
     
     def set_characteristics(self, plane):
         """Randomly assign bags to the specified proportion of 
@@ -118,18 +347,16 @@ class Boarding:
         """
         n_bags = ceil(len(plane) * self.bag_percent)
         bags = [True] * n_bags + [False] * (len(plane) - n_bags)
-        shuffle(bags)
+        self.rng.shuffle(bags)
         
         n_slow = ceil(len(plane) * self.slow_percent)
         n_fast = ceil(len(plane) * self.fast_percent)
         n_average = len(plane) - n_slow - n_fast
         speeds = [3] * n_slow + [2] * n_average + [1] * n_fast
-        shuffle(speeds)
+        self.rng.shuffle(speeds)
         
-        for passenger, (bag, speed) in enumerate(zip(bags, speeds)):
-            plane[passenger]['bag_countdown'] = speed
-            if not bag:
-                plane[passenger]['bag_countdown'] = 0
+        for passenger, bag, speed in zip(plane, bags, speeds):
+            passenger.bag_countdown = speed if bag else 0
                 
         return plane
     
@@ -151,7 +378,7 @@ class Boarding:
         groups = [passengers[group_index[i]: group_index[i+1]] 
                   for i in range(len(group_index)-1)]
         for group in groups:
-            shuffle(group)
+            self.rng.shuffle(group)
         return [passenger for group in groups for passenger in group]
     
     def group_WMA(self):
@@ -176,56 +403,75 @@ class Boarding:
                         to_shuffle.append((self.rows - row, aisle))
                     else:
                         to_shuffle.append((row + 1, aisle))
-                    shuffle(to_shuffle)
+                    self.rng.shuffle(to_shuffle)
                 groups.append(to_shuffle)
         return [passenger for group in groups for passenger in group]
     
-    def create_passengers(self):
-        """Return a dictionary of passengers with the following 
-        structure, ordered according the the boarding method:
-        
-        Key - passenger number (0 to n-1)
-        
-        Value - dictionary containing:
-            target - the passenger's seat as a tuple (e.g. (1,2))
-            row - the row the passenger is currently in (0 if either not
-                  yet on the plane or already seated)
-            seated - whether the passenger is seated or not yet
-            bag_countdown - represents the number of steps to put the 
-                            bag away. 0 represents no bag to put away. 
-                            1, 2 or 3 are assigned depending on whether 
-                            the passenger is slow, average or fast. 
-        """
-        seats = list(range(1, sum(self.abreast) + len(self.abreast)))
-        count = 0
-        aisles = []
-        for a in self.abreast[:-1]:
-            count += a
-            aisles.append(seats[count])
-            del seats[count]
-        self.aisles = aisles
-        self.seats = seats
-        
-        # Order of aisles by proximity to middle aisle
-        seat_dict = {}
-        for seat in seats:
-            distances = []
-            for aisle in self.aisles:
-                distance = abs(seat - aisle)
-                distances.append(distance)
-            seat_dict[seat] = min(distances)
-        self.aisle_order = seats.copy()
-        self.aisle_order.sort(key=lambda x: seat_dict[x], reverse=True)
+    def row_groups(self, back_first):
+        """Return an array of the boarding group of each row (index 0 is 
+        unused), with the same group sizes as group_back_front and 
+        group_WMA. Group 0 is at the rear of the plane if back_first is 
+        True, otherwise at the front.
+        """
+        group_sizes = [self.rows // self.n_groups] * self.n_groups
+        for i in range(self.rows % self.n_groups):
+            group_sizes[i] = group_sizes[i] + 1
+        groups = np.repeat(np.arange(self.n_groups), group_sizes)
+        if back_first:
+            groups = groups[::-1]
+        return np.concatenate([[0], groups])
+
+    def create_queues(self, generator, n_runs):
+        """Return an array of shape (n_runs, n_passengers) where each row
+        is a boarding queue, given as indices into 
+        self.layout.passenger_seats, ordered according to the boarding 
+        method. The queues are created together by sorting on 
+        precomputed keys (boarding group, row, seat rank) with a random 
+        tiebreak drawn from the NumPy generator, so they follow the same
+        rules as boarding_method but not the same random stream.
+        """
+        seats = np.array(self.layout.passenger_seats)
+        row, seat = seats[:, 0], seats[:, 1]
+        rank = np.zeros(max(self.layout.seats) + 1, dtype=int)
+        rank[list(self.layout.aisle_rank)] = list(
+            self.layout.aisle_rank.values())
+        rank = rank[seat]
+        shape = (n_runs, len(seats))
+        tiebreak = generator.random(shape)
 
+        if self.method in ('back-to-front', 'front-to-back'):
+            group = self.row_groups(self.method == 'back-to-front')[row]
+            keys = (tiebreak, group)
+        elif self.method == 'WMA':
+            keys = (tiebreak, rank)
+        elif self.method in ('front-to-back WMA', 'back-to-front WMA'):
+            group = self.row_groups(self.method == 'back-to-front WMA')[row]
+            keys = (tiebreak, rank, group)
+        elif self.method == 'optimal':
+            keys = (-row, rank)
+        else:
+            keys = (tiebreak,)
+        keys = [np.broadcast_to(key, shape) for key in keys]
+        return np.lexsort(keys, axis=-1)
+    
+    def create_passengers(self):
+        """Return a list of Passenger objects ordered according the the 
+        boarding method, the index of each being the passenger number (0 
+        to n-1). Every passenger starts at row 0 of their boarding aisle,
+        waiting to enter at their door. bag_countdown represents the
+        number of steps to put the bag away. 0 represents no bag to put
+        away. 1, 2 or 3 are assigned depending on whether the passenger
+        is slow, average or fast.
+        """
         # Coordinates of all seats on the plane, sorted by boarding method.
-        passengers = list(product(range(1, self.rows + 1), seats))
+        passengers = list(self.layout.passenger_seats)
         passengers = self.boarding_method(passengers)
         boarding_aisles = self.set_boarding_aisles(passengers)
+        boarding_doors = self.set_boarding_doors(passengers)
 
-        plane = [{'target': i, 'position': k, 'seated': False, 
-                  'bag_countdown': None} 
-                 for i,k in zip(passengers, boarding_aisles)]
-        plane = {k:v for k,v in zip(range(0, len(plane)), plane)}
+        plane = [Passenger(i, 0, k, door=d) 
+                 for i,k,d in zip(passengers, boarding_aisles, 
+                                  boarding_doors)]
         
         plane = self.set_characteristics(plane)
         
@@ -233,90 +479,335 @@ class Boarding:
 
     def get_occupied(self, plane):
         """Return a list of aisle positions currently occupied."""
-        return [plane[passenger]['position'] for passenger in plane]
+        return [passenger.position for passenger in plane]
+
+    def create_occupancy(self, plane):
+        """Return a dictionary with the aisles as keys and, as values, a 
+        list of the number of passengers in each row of that aisle. Row 0
+        counts passengers who are either not yet on the plane or seated.
+        """
+        occupancy = {aisle: [0] * (self.rows + 1) for aisle in self.aisles}
+        for passenger in plane:
+            occupancy[passenger.aisle][passenger.row] += 1
+        return occupancy
+
+    def is_free(self, plane, row, aisle):
+        """True if no passenger is in the given row of the given aisle, 
+        else False.
+        """
+        if self.engine == 'scan':
+            return (row, aisle) not in self.get_occupied(plane)
+        return self.occupancy[aisle][row] == 0
+
+    def set_position(self, plane, passenger, row, aisle):
+        """Move a passenger to a new row and aisle, keeping the 
+        occupancy grid up to date when the grid or event engine is used 
+        and recording the move when deltas are being recorded. With the
+        event engine, a passenger waiting for the row that has been left
+        is woken if it is now free. With a shared door, the number of 
+        passengers in each aisle is also kept up to date.
+        """
+        p = plane[passenger]
+        if self.shared_door:
+            if p.row > 0:
+                self.aisle_load[p.aisle] -= 1
+            if row > 0:
+                self.aisle_load[aisle] += 1
+        if self.engine != 'scan':
+            left = self.occupancy[p.aisle]
+            left[p.row] -= 1
+            if self.engine == 'event' and left[p.row] == 0 and p.row > 0:
+                self.wake(p.row, p.aisle, passenger)
+            self.occupancy[aisle][row] += 1
+        p.row = row
+        p.aisle = aisle
+        if self.record == 'deltas':
+            self.step_deltas.append((passenger, row, aisle, p.seated))
 
     def check_all(self, plane):
         """True if all passengers are seated, else False."""
-        return all([plane[passenger]['seated'] for passenger in plane])
+        return all(passenger.seated for passenger in plane)
 
-    def blocked(self, seat, current_position):
+    def blocked(self, seat, aisle):
         """Return a list of seats in a passenger's row which they must 
         pass to reach their seat from the aisle. (This does not check 
         whether the seats are occupied or not.)
         """
         row = seat[0]
-        seat_aisle = seat[1]
-        current_aisle = current_position[1]
-        if seat_aisle > current_aisle:
-            blocked = [(row, a) 
-                       for a in range(current_aisle + 1, seat_aisle + 1)]
-        else:
-            blocked = [(row, a) for a in range(seat_aisle, current_aisle)]
-        blocked.remove(seat)
-        
-        return blocked
+        return [(row, a) for a in self.layout.blocked[(seat[1], aisle)]]
+
+    def row_ahead(self, p):
+        """Return the row a passenger moves to next: their door if they
+        are not yet on the plane, otherwise the next row towards their 
+        seat.
+        """
+        row = p.row
+        if row == 0:
+            return p.door
+        if row < p.target[0]:
+            return row + 1
+        return row - 1
     
     def update_passenger(self, plane, passenger):
         """Update the status of a given passenger if the passenger is not
         already seated and has the option to move. Return the updated 
-        dictionary of all passengers.
+        list of all passengers.
         """
+        p = plane[passenger]
         # Check if the passenger is seated or not.
-        if not plane[passenger]['seated']:
-            current_position = plane[passenger]['position']
-            current_bag = plane[passenger]['bag_countdown']
-            seat_row = plane[passenger]['target'][0]
+        if not p.seated:
+            row = p.row
+            aisle = p.aisle
+            current_bag = p.bag_countdown
+            seat_row = p.target[0]
             
             # If the passenger has reached their row and they have a 
             # bag, their bag count is reduced by one. If this makes 
             # their count 0, their bag is now put away, otherwise the 
             # passenger is one step closer to putting the bag away.
-            if current_position[0] == seat_row and current_bag >= 1:
-                plane[passenger]['bag_countdown'] = current_bag - 1
+            if row == seat_row and current_bag >= 1:
+                p.bag_countdown = current_bag - 1
             
             # If the passenger has reached their row and doesn't have a 
             # bag to put away, any other passengers blocking access to
             # the seat move back out into the aisle and the passenger
             # sits down.
-            elif current_position[0] == seat_row and current_bag == 0:
-                blocked_seats = self.blocked(plane[passenger]['target'], 
-                                             current_position)
-                for person in plane:
-                    if (plane[person]['target'] in blocked_seats 
-                        and plane[person]['seated']
-                       ):
-                        plane[person]['seated'] = False
-                        plane[person]['position'] = current_position
-                plane[passenger]['seated'] = True
-                plane[passenger]['position'] = (0, current_position[1])
+            elif row == seat_row and current_bag == 0:
+                for seat in self.blocked(p.target, aisle):
+                    person = self.seat_map.pop(seat, None)
+                    if person is not None:
+                        plane[person].seated = False
+                        self.set_position(plane, person, row, aisle)
+                        self.reactivate(person, passenger)
+                p.seated = True
+                self.n_seated += 1
+                self.seat_map[p.target] = passenger
+                self.set_position(plane, passenger, 0, aisle)
             
-            # If the next row of the aisle is free, move the passenger to 
-            # that row. 
-            elif ((current_position[0] + 1, current_position[1])
-                  not in self.get_occupied(plane)):
-                plane[passenger]['position'] = (current_position[0] + 1, 
-                                                current_position[1])
-            
-            # There are no possible actions for the passenger to take. 
+            # Passengers waiting at a shared door enter the plane if it 
+            # is their turn and there is room.
+            elif row == 0 and self.shared_door:
+                self.enter_shared_door(plane, passenger)
+
+            # If the next row of the aisle towards the passenger's seat
+            # is free, move the passenger to that row. Otherwise there 
+            # are no possible actions for the passenger to take.
             else:
-                pass
+                ahead = self.row_ahead(p)
+                if self.is_free(plane, ahead, aisle):
+                    self.set_position(plane, passenger, ahead, aisle)
         
         return plane
     
-    def board_plane(self):
+    def enter_shared_door(self, plane, passenger):
+        """Move a passenger waiting at a shared door to the door's row 
+        if they are at the front of the door's queue, no one else has 
+        entered through the door in this step and the door's row is free
+        in one of the aisles either side of their seat's block. Of those 
+        aisles, the passenger takes the one with the lowest cost, the 
+        number of passengers in the aisle plus the number of seats they
+        must pass to reach their seat from it, keeping the aisle they 
+        were given before boarding on a tie. Return True if the passenger
+        entered, else False.
+        """
+        p = plane[passenger]
+        door = p.door
+        queue = self.door_queues[door]
+        if queue[0] != passenger or self.door_steps[door] == self.steps:
+            return False
+        seat = p.target[1]
+        best = None
+        best_cost = None
+        for aisle in self.layout.bordering_aisles[seat]:
+            if self.is_free(plane, door, aisle):
+                cost = (self.aisle_load[aisle] 
+                        + len(self.layout.blocked[(seat, aisle)]))
+                if (best is None or cost < best_cost 
+                        or (cost == best_cost and aisle == p.aisle)):
+                    best = aisle
+                    best_cost = cost
+        if best is None:
+            return False
+        queue.popleft()
+        self.door_steps[door] = self.steps
+        self.set_position(plane, passenger, door, best)
+        # The next passenger in the queue can enter in the next step.
+        if self.engine == 'event' and queue:
+            self.next_active.append(queue[0])
+        return True
+
+    def reactivate(self, person, passenger):
+        """Add a passenger who has been moved back into the aisle by the 
+        passenger currently being updated to the active passengers. They
+        are updated later in the current step if they come after that 
+        passenger in the boarding order, otherwise in the next step.
+        """
+        self.n_seated -= 1
+        if person > passenger:
+            heappush(self.active, person)
+        else:
+            self.next_active.append(person)
+
+    def wake(self, row, aisle, passenger):
+        """Schedule the next passenger, in the order passengers are 
+        updated, who is waiting for a row of an aisle which has just 
+        become free. If they come after the passenger being updated they
+        are updated later in the current step, otherwise in the next 
+        step. Only one waiter is woken, as whoever moves into the row 
+        first makes the others wait again.
+        """
+        waiters = self.waiters[aisle][row]
+        if waiters:
+            i = bisect_right(waiters, passenger)
+            if i < len(waiters):
+                heappush(self.active, waiters.pop(i))
+            else:
+                self.next_active.append(waiters.pop(0))
+
+    def update_passenger_event(self, plane, passenger):
+        """Update a passenger in the same way as update_passenger, but 
+        instead of counting down their bag one step at a time, schedule
+        them for the step in which they will sit down, and instead of 
+        trying to move every step while the row ahead is occupied, add 
+        them to the passengers waiting for that row. Passengers who move
+        are updated again in the next step. Passengers waiting at a 
+        shared door are only updated once they are at the front of its 
+        queue.
+        """
+        p = plane[passenger]
+        if p.seated:
+            return
+        row = p.row
+        aisle = p.aisle
+        if row == p.target[0] and p.bag_countdown >= 1:
+            heappush(self.timers, (self.steps + p.bag_countdown, passenger))
+            p.bag_countdown = 0
+        elif row == p.target[0]:
+            self.update_passenger(plane, passenger)
+        elif row == 0 and self.shared_door:
+            if self.enter_shared_door(plane, passenger):
+                self.next_active.append(passenger)
+            elif (self.door_queues[p.door][0] == passenger 
+                  and self.door_steps[p.door] != self.steps):
+                # No aisle is free, so the front of the queue tries again
+                # in the next step. If the door has been used in this 
+                # step, the passenger has just reached the front and has
+                # already been scheduled.
+                self.next_active.append(passenger)
+        else:
+            ahead = self.row_ahead(p)
+            if self.occupancy[aisle][ahead] == 0:
+                self.set_position(plane, passenger, ahead, aisle)
+                self.next_active.append(passenger)
+            else:
+                insort(self.waiters[aisle][ahead], passenger)
+
+    def board_plane(self, record='frames'):
         """Iterate through each passenger and run the update_passenger 
-        method on them until there are no passengers left unseated. At
-        the end of each iteration through the list of passengers, append 
-        the plane dictionary to a list. These dictionaries in this list 
-        represent one frame of the GIF animation. 
+        method on them until there are no passengers left unseated. 
+        Only passengers who are not seated are iterated through, in 
+        boarding order, and the number of seated passengers is counted
+        as they sit down and stand up. With the event engine only 
+        passengers who can do something are iterated through, giving the
+        same steps and passenger positions. The number of iterations is
+        saved as self.steps. What is recorded at 
+        the end of each iteration depends on record:
+            frames - a copy of the list of passengers is appended to 
+                     self.frames. Each list represents one frame of the 
+                     GIF animation.
+            deltas - a list of (passenger, row, aisle, seated) tuples 
+                     for each change made during the iteration is 
+                     appended to self.deltas. Frames can be rebuilt from
+                     these with rebuild_frame.
+            None - nothing is recorded.
         """
         plane = self.create_passengers()
         self.plane = plane
+        self.record = record
+        if self.engine != 'scan':
+            self.occupancy = self.create_occupancy(plane)
+        # Seats mapped to the passenger currently sitting in them.
+        self.seat_map = {}
+        if self.shared_door:
+            # Passengers in each aisle, and the queue at each door and 
+            # the last step someone entered through it.
+            self.aisle_load = dict.fromkeys(self.aisles, 0)
+            self.door_queues = {door: deque() for door in self.doors}
+            for passenger, p in enumerate(plane):
+                self.door_queues[p.door].append(passenger)
+            self.door_steps = dict.fromkeys(self.doors, -1)
         self.frames = []
-        while not self.check_all(plane):
-            for passenger in plane.keys():
+        self.deltas = []
+        if record == 'deltas':
+            self.initial_plane = [passenger.copy() for passenger in plane]
+        self.steps = 0
+        self.n_seated = 0
+        self.next_active = list(range(len(plane)))
+        if self.engine == 'event':
+            self.board_plane_events(plane)
+            return
+        while self.n_seated < len(plane):
+            self.step_deltas = []
+            self.active = self.next_active
+            heapify(self.active)
+            self.next_active = []
+            while self.active:
+                passenger = heappop(self.active)
                 plane = self.update_passenger(plane, passenger)
-            self.frames.append(deepcopy(plane))
+                if not plane[passenger].seated:
+                    self.next_active.append(passenger)
+            self.steps += 1
+            self.record_step(plane)
+
+    def board_plane_events(self, plane):
+        """Board the plane with the event engine. self.steps is the 
+        current step while passengers are updated. When no passengers 
+        are scheduled until a later step, e.g. while everyone in the 
+        aisle is waiting behind passengers putting their bags away, the 
+        steps in between are recorded as unchanged.
+        """
+        self.waiters = {aisle: [[] for _ in range(self.rows + 1)] 
+                        for aisle in self.aisles}
+        self.timers = []
+        while self.n_seated < len(plane):
+            if not self.next_active:
+                while self.steps + 1 < self.timers[0][0]:
+                    self.step_deltas = []
+                    self.steps += 1
+                    self.record_step(plane)
+            self.steps += 1
+            self.step_deltas = []
+            self.active = self.next_active
+            while self.timers and self.timers[0][0] == self.steps:
+                self.active.append(heappop(self.timers)[1])
+            heapify(self.active)
+            self.next_active = []
+            while self.active:
+                self.update_passenger_event(plane, heappop(self.active))
+            self.record_step(plane)
+
+    def record_step(self, plane):
+        """Record the plane at the end of a step according to 
+        self.record.
+        """
+        if self.record == 'frames':
+            self.frames.append([passenger.copy() for passenger in plane])
+        elif self.record == 'deltas':
+            self.deltas.append(self.step_deltas)
+
+    def rebuild_frame(self, step):
+        """Return the list of passengers at the end of a given step (the 
+        first step being 0), rebuilt from the recorded deltas. Only the 
+        positions and seated status of passengers are rebuilt, bag 
+        countdowns are as they were before boarding.
+        """
+        plane = [passenger.copy() for passenger in self.initial_plane]
+        for deltas in self.deltas[:step + 1]:
+            for passenger, row, aisle, seated in deltas:
+                plane[passenger].row = row
+                plane[passenger].aisle = aisle
+                plane[passenger].seated = seated
+        return plane
         
     def set_colours(self):
         """Create a list of colours the same length as the number of 
@@ -338,34 +829,88 @@ class Boarding:
         is created. The list of colours is also repeated for each frame 
         of the annimation.
         """
+        if self.record == 'deltas':
+            self.create_GIF_lists_from_deltas()
+            return
+
         positions = []
         for plane in self.frames:
             temp = []
             for passenger in plane:
-                seat = plane[passenger]['target']
-                current_position = plane[passenger]['position']
-                
-                if plane[passenger]['seated']:
-                    plane[passenger]['location'] = seat
-                    temp.append([seat[0], seat[1]])
+                if passenger.seated:
+                    temp.append(list(passenger.target))
                 else:
-                    plane[passenger]['location'] = current_position
-                    temp.append([current_position[0], current_position[1]])
+                    temp.append([passenger.row, passenger.aisle])
             positions.append(temp)
         
         self.positions = positions
         self.colour_list = [self.colours for i in range(len(self.positions))]
+
+    def create_GIF_lists_from_deltas(self):
+        """Create the same lists as create_GIF_lists by applying the 
+        recorded deltas to each passenger's coordinates one step at a 
+        time, without rebuilding the plane dictionary for each frame.
+        """
+        plane = self.initial_plane
+        current = [[passenger.row, passenger.aisle] for passenger in plane]
+        positions = []
+        for deltas in self.deltas:
+            for passenger, row, aisle, seated in deltas:
+                if seated:
+                    current[passenger] = list(plane[passenger].target)
+                else:
+                    current[passenger] = [row, aisle]
+            positions.append([coordinates.copy() for coordinates in current])
+
+        self.positions = positions
+        self.colour_list = [self.colours for i in range(len(self.positions))]
+
+    def frame_numbers(self, stride=1, max_frames=None):
+        """Return a list of the steps to show in an animation: every 
+        stride-th step and the final step. If there are more than 
+        max_frames of these, max_frames of them are chosen evenly spaced
+        back from the final step, which is always shown, to the first.
+        """
+        frames = list(range(0, self.steps, stride))
+        if frames[-1] != self.steps - 1:
+            frames.append(self.steps - 1)
+        if max_frames is not None and len(frames) > max_frames:
+            chosen = np.linspace(len(frames) - 1, 0, max_frames).round()
+            frames = [frames[i] for i in np.unique(chosen.astype(int))]
+        return frames
+
+    def iter_positions(self, frames=None):
+        """Yield an array of each passenger's coordinates after each step
+        in frames (every step if None) from the recorded deltas. The same
+        array is updated and yielded each step, so only one step's 
+        positions are held at a time.
+        """
+        plane = self.initial_plane
+        positions = np.array([[passenger.row, passenger.aisle] 
+                              for passenger in plane])
+        frames = set(range(len(self.deltas)) if frames is None else frames)
+        for step, deltas in enumerate(self.deltas):
+            for passenger, row, aisle, seated in deltas:
+                if seated:
+                    positions[passenger] = plane[passenger].target
+                else:
+                    positions[passenger] = row, aisle
+            if step in frames:
+                yield positions
         
         
     def plot_boarding_order(self, filename, dpi):
         """Save a png file showing the order of boarding for a given 
         boarding method.
         """
+        # Imported here so the simulation can run without matplotlib.
+        import matplotlib.pyplot as plt
+
         abreast = sum(self.abreast)
         
         plane = self.create_passengers()
-        x = [plane[passenger]['target'][0] for passenger in plane]
-        y = [plane[passenger]['target'][1] for passenger in plane]
+        x = [passenger.target[0] for passenger in plane]
+        y = [passenger.target[1] for passenger in plane]
         
         fig = plt.figure(figsize=(12, 12 * (abreast / self.rows)), 
                          dpi=dpi)
@@ -384,7 +929,7 @@ class Boarding:
             y, 
             s=marker_area, 
             marker='s', 
-            c=list(plane.keys()), 
+            c=list(range(len(plane))), 
             cmap='BuGn', 
             linewidths=1, 
             edgecolors='black',
@@ -394,7 +939,8 @@ class Boarding:
         # boards.
         text_colour = (['black'] * ceil(0.5 * len(plane)) 
                        + ['white'] * floor(0.5 * len(plane)))
-        for x_coord, y_coord, text, colour in zip(x, y, plane.keys(), text_colour):
+        for x_coord, y_coord, text, colour in zip(x, y, range(len(plane)), 
+                                                  text_colour):
             plt.text(
                 x_coord, 
                 y_coord, 
@@ -454,18 +1000,45 @@ class Boarding:
         fig.tight_layout()
         fig.savefig(filename, dpi=dpi)
         
-    def create_GIF(self, dpi):
+    def create_GIF(self, dpi, filename=None, renderer='matplotlib', 
+                   stride=1, max_frames=None, n_workers=1):
         """Create a GIF where each frame of the animation represents the 
         position of each passenger after each passenger has had the 
-        opportunity to make one step.
+        opportunity to make one step. The GIF is saved to filename, or
+        the method name followed by .gif if not given. For quicker 
+        previews, only every stride-th step (and the last) is shown, up 
+        to max_frames frames.
+
+        With renderer='raster', frames are drawn directly with PIL by 
+        RasterRenderer, in chunks across n_workers processes, and written
+        as they are drawn, which is much faster for long animations. The
+        animation is then saved as an MP4 video if filename ends with 
+        .mp4 and ffmpeg is installed. The matplotlib renderer ignores 
+        n_workers.
         """
-        self.board_plane()
+        if renderer not in ('matplotlib', 'raster'):
+            raise ValueError("renderer must be 'matplotlib' or 'raster'")
+        if filename is None:
+            filename = self.method + '.gif'
+        self.board_plane(record='deltas')
+        frames = self.frame_numbers(stride, max_frames)
+        if renderer == 'raster':
+            from raster_renderer import RasterRenderer, save_animation
+
+            raster = RasterRenderer(self, width=12 * dpi)
+            save_animation(raster, self.iter_positions(frames), filename, 
+                           duration=300, n_workers=n_workers)
+            return
+
+        from matplotlib.animation import FuncAnimation
+        import matplotlib.pyplot as plt
+
         self.set_colours()
         self.create_GIF_lists()
         abreast = sum(self.abreast)
         
-        x = [self.plane[passenger]['target'][0] for passenger in self.plane]
-        y = [self.plane[passenger]['target'][1] for passenger in self.plane]
+        x = [passenger.target[0] for passenger in self.plane]
+        y = [passenger.target[1] for passenger in self.plane]
         
         # Create a list of seat labels. E.g. 1A, 1B, 1C, etc.
         aisle_labels = 'ABCDEFGHJKLMN'
@@ -484,7 +1057,7 @@ class Boarding:
         # pixelated.
         fig.patch.set_facecolor('white')
         title_str = ('Method: ' + self.method + '  -  Steps: ' 
-                     + str(len(self.frames)))
+                     + str(self.steps))
         plt.title(title_str, loc='left')
         
         # Add squares to represent the seats and add text to show their 
@@ -540,19 +1113,19 @@ class Boarding:
         anim = FuncAnimation(
             fig, 
             animate, 
-            frames=len(self.frames), 
+            frames=frames, 
             interval=300,
             fargs=(self.colour_list, self.positions, scat)
         )
-        anim.save(self.method + '.gif', writer='pillow', dpi=dpi)
+        anim.save(filename, writer='pillow', dpi=dpi)
         plt.close()
     
     def return_steps(self):
         """Run the boarding simulation and return the number of steps taken
         to board the plane.
         """
-        self.board_plane()
-        return len(self.frames)
+        self.board_plane(record=None)
+        return self.steps
 
 
 def main(output):
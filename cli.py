@@ -0,0 +1,405 @@
+from argparse import ArgumentParser
+from ast import literal_eval
+import csv
+from itertools import product
+import json
+import sys
+
+import numpy as np
+
+from analysis import (PlotSimulations, ResultCache, Simulations,
+                      profile_block, replicate_seeds, simulate_block,
+                      sweep_path)
+from boarding_simulator import Boarding
+from continuous_simulator import ContinuousBoarding
+
+
+# Engines of Boarding.
+ENGINES = ['scan', 'grid', 'event']
+
+# Options of the continuous engine, which simulate passes to 
+# ContinuousBoarding.
+CONTINUOUS = ['walk_time', 'walk_sigma', 'stow_time', 'stow_sigma', 
+              'shuffle_time']
+
+SWEEPS = {'by-method': 'steps_by_method',
+          'by-aisles': 'steps_by_no_aisles',
+          'by-number-groups': 'steps_by_n_groups',
+          'by-doors': 'steps_by_doors'}
+
+# The PlotSimulations method of each chart and the sweep it plots.
+CHARTS = {'by-method': ('plot_steps_by_method', 'by-method'),
+          'by-aisles': ('plot_steps_by_no_aisles', 'by-aisles'),
+          'by-number-groups': ('plot_steps_by_n_groups', 'by-number-groups'),
+          'by-doors': ('plot_steps_by_doors', 'by-doors'),
+          'regression-by-method': ('plot_regression_by_method', 'by-method'),
+          'std-by-method': ('plot_std_by_method', 'by-method')}
+
+# Options which may contain {name} fields filled in from the other
+# options of a job, so each job of a grid can write to its own file.
+FORMATTED = ['filename', 'output', 'output_dir']
+
+
+def create_boarding(options):
+    """Return a Boarding for the plane and passengers in options. The
+    number of groups defaults to the number of rows.
+    """
+    n_groups = options['n_groups'] or options['rows']
+    return Boarding(options['rows'], options['abreast'], options['method'],
+                    options['bag_percent'], options['slow_average_fast'],
+                    n_groups, engine=options['engine'], seed=options['seed'],
+                    doors=options['doors'], 
+                    shared_door=options['shared_door'])
+
+
+def run_simulate(options):
+    """Run the boarding simulation runs times and write a csv table of the
+    seed and steps of each run to the output file, or standard output.
+    Seeds are derived from the seed option as in a sweep, so each run
+    matches the sweep result for the same seed. The continuous engine 
+    also writes the seconds taken.
+    """
+    seed = options['seed']
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    n_groups = options['n_groups'] or options['rows']
+    doors = options['doors'] or [1]
+    cell = (options['abreast'], options['method'], options['bag_percent'],
+            n_groups) + ((doors,) if doors != [1] else ())
+    seeds = replicate_seeds(seed, cell, 0, options['runs'])
+    task = (options['rows'], options['abreast'], options['method'],
+            options['bag_percent'], options['slow_average_fast'], n_groups,
+            options['engine'], doors, options['shared_door'], seeds)
+    seconds = None
+    if options['engine'] == 'continuous':
+        steps, seconds = simulate_continuous(task, options)
+    elif options['profile']:
+        steps, stats = profile_block(task)
+        print(stats.report(), file=sys.stderr)
+    else:
+        steps = simulate_block(task)
+
+    columns = ['rows', 'abreast', 'method', 'bag_percent', 'n_groups',
+               'doors', 'shared_door']
+    f = open(options['output'], 'w', newline='') if options['output'] \
+        else sys.stdout
+    try:
+        writer = csv.writer(f)
+        columns += ['seed', 'steps']
+        if seconds is not None:
+            columns.append('seconds')
+        writer.writerow(columns)
+        for i, (replicate_seed, replicate_steps) in enumerate(zip(seeds, 
+                                                                  steps)):
+            row = [options['rows'], options['abreast'], options['method'], 
+                   options['bag_percent'], n_groups, doors, 
+                   options['shared_door'], replicate_seed, replicate_steps]
+            if seconds is not None:
+                row.append(seconds[i])
+            writer.writerow(row)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def simulate_continuous(task, options):
+    """Return lists of the steps and seconds taken in each simulation of
+    a simulate_block task with ContinuousBoarding.
+    """
+    rows, abreast, method, bag_percent, slow_average_fast, n_groups, \
+        engine, doors, shared_door, seeds = task
+    if shared_door:
+        raise ValueError('The continuous engine does not model a shared '
+                         'door')
+    if options['profile']:
+        raise ValueError('The continuous engine cannot be profiled')
+    aero = ContinuousBoarding(rows, abreast, method, bag_percent, 
+                              slow_average_fast, n_groups, doors=doors, 
+                              **{name: options[name] for name in CONTINUOUS})
+    steps = []
+    seconds = []
+    for replicate_seed in seeds:
+        aero.seed(replicate_seed)
+        replicate_seconds, replicate_steps = aero.return_times()
+        steps.append(replicate_steps)
+        seconds.append(replicate_seconds)
+    return steps, seconds
+
+
+def run_sweep(options):
+    """Run one of the Simulations sweeps."""
+    cache = None
+    if options['cache']:
+        cache = ResultCache(options['cache'], options['cache_size'])
+    aero = Simulations(options['rows'], options['abreast'],
+                       options['bag_percent'], options['slow_average_fast'],
+                       options['engine'], n_runs=options['runs'],
+                       n_workers=options['workers'],
+                       chunk_size=options['chunk_size'], seed=options['seed'],
+                       output_format=options['format'],
+                       compression=options['compression'],
+                       resume=options['resume'], cache=cache,
+                       ci_width=options['ci_width'],
+                       aggregate=options['aggregate'],
+                       output_dir=options['output_dir'],
+                       profile=options['profile'],
+                       shared_door=options['shared_door'])
+    getattr(aero, SWEEPS[options['sweep']])()
+    if options['profile']:
+        print(aero.stats.report(), file=sys.stderr)
+
+
+def run_gif(options):
+    """Save a GIF of the boarding. The matplotlib renderer draws every
+    frame in this process and ignores workers, so a workers default 
+    given for a whole config file does not stop gif jobs from running.
+    """
+    create_boarding(options).create_GIF(
+        options['dpi'], options['filename'], options['renderer'],
+        options['stride'], options['max_frames'], options['workers'])
+
+
+def run_order_plot(options):
+    """Save a png file of the boarding order."""
+    filename = options['filename'] or options['method'] + '.png'
+    create_boarding(options).plot_boarding_order(filename, options['dpi'])
+
+
+def run_plot(options):
+    """Save a chart of the results of a sweep, read from a csv file or a
+    parquet file or directory. By default the results are read from where
+    the sweep command saves them with the same output directory, format,
+    aggregate and shared door options.
+    """
+    import pandas as pd
+
+    plot, sweep = CHARTS[options['chart']]
+    data = options['data']
+    if data is None:
+        name = Simulations.SWEEP_FILES[SWEEPS[sweep]]
+        data = sweep_path(options['output_dir'], name, options['shared_door'],
+                          options['aggregate']) + '.' + options['format']
+    if data.endswith('.parquet'):
+        df = pd.read_parquet(data)
+    else:
+        df = pd.read_csv(data)
+    getattr(PlotSimulations(df), plot)(options['filename'])
+
+
+def add_plane_arguments(parser, engines=ENGINES):
+    """Add the arguments describing the plane and its passengers."""
+    parser.add_argument('--rows', type=int, default=30)
+    parser.add_argument('--abreast', type=literal_eval, default=[3, 3],
+                        help='seats per row between aisles, e.g. [3,3]')
+    parser.add_argument('--bag-percent', type=float, default=0.7)
+    parser.add_argument('--slow-average-fast', type=literal_eval,
+                        default=[0.2, 0.6, 0.2])
+    parser.add_argument('--engine', default='event', choices=engines)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--shared-door', action='store_true',
+                        help='one queue at each door for every aisle')
+
+
+def add_boarding_arguments(parser, engines=ENGINES):
+    """Add the arguments for a single boarding."""
+    add_plane_arguments(parser, engines)
+    parser.add_argument('--method', default='random')
+    parser.add_argument('--n-groups', type=int,
+                        help='number of boarding groups (default: rows)')
+    parser.add_argument('--doors', type=literal_eval,
+                        help='rows of the doors, e.g. [1,30] (default: [1])')
+
+
+def create_parser():
+    """Return the argument parser and a dictionary of the parser of each
+    subcommand.
+    """
+    parser = ArgumentParser(
+        description='Simulate plane boarding and plot the results.')
+    parser.add_argument('--config',
+                        help='yaml or json file of jobs to run in turn')
+    subparsers = parser.add_subparsers(dest='command')
+    commands = {}
+
+    simulate = subparsers.add_parser(
+        'simulate', help='run one boarding configuration')
+    add_boarding_arguments(simulate, ENGINES + ['continuous'])
+    simulate.add_argument('--runs', type=int, default=1)
+    simulate.add_argument('--output', help='csv file (default: stdout)')
+    simulate.add_argument('--profile', action='store_true',
+                          help='print time spent in each branch')
+    continuous = simulate.add_argument_group(
+        'continuous engine', 'times in seconds, see ContinuousBoarding')
+    continuous.add_argument('--walk-time', type=float, default=1.0,
+                            help='median time to walk a row')
+    continuous.add_argument('--walk-sigma', type=float, default=0.2)
+    continuous.add_argument('--stow-time', type=float, default=4.0,
+                            help='median time to stow a bag per '
+                                 'slow/average/fast unit')
+    continuous.add_argument('--stow-sigma', type=float, default=0.5)
+    continuous.add_argument('--shuffle-time', type=float, default=5.0,
+                            help='time to get past each seated passenger')
+    simulate.set_defaults(run=run_simulate)
+    commands['simulate'] = simulate
+
+    sweep = subparsers.add_parser(
+        'sweep', help='run one of the sweeps of Simulations')
+    sweep.add_argument('sweep', nargs='?', default='by-method',
+                       choices=list(SWEEPS))
+    add_plane_arguments(sweep)
+    sweep.add_argument('--runs', type=int, default=1000,
+                       help='replicates per cell (maximum with --ci-width)')
+    sweep.add_argument('--workers', type=int, default=1)
+    sweep.add_argument('--chunk-size', type=int)
+    sweep.add_argument('--format', default='csv',
+                       choices=['csv', 'parquet'])
+    sweep.add_argument('--compression', default='snappy')
+    sweep.add_argument('--resume', action='store_true')
+    sweep.add_argument('--cache', help='result cache directory')
+    sweep.add_argument('--cache-size', type=int, default=2**30,
+                       help='maximum cache size in bytes')
+    sweep.add_argument('--ci-width', type=float)
+    sweep.add_argument('--aggregate', action='store_true')
+    sweep.add_argument('--output-dir', default='data')
+    sweep.add_argument('--profile', action='store_true',
+                       help='print time spent in each branch')
+    sweep.set_defaults(run=run_sweep)
+    commands['sweep'] = sweep
+
+    gif = subparsers.add_parser('gif', help='save a GIF of a boarding')
+    add_boarding_arguments(gif)
+    gif.add_argument('--dpi', type=int, default=100)
+    gif.add_argument('--filename', help='default: method name + .gif')
+    gif.add_argument('--renderer', default='matplotlib',
+                     choices=['matplotlib', 'raster'],
+                     help='raster is faster and can also save .mp4 files')
+    gif.add_argument('--stride', type=int, default=1,
+                     help='show every stride-th step')
+    gif.add_argument('--max-frames', type=int)
+    gif.add_argument('--workers', type=int, default=1,
+                     help='processes drawing frames (ignored by the '
+                          'matplotlib renderer)')
+    gif.set_defaults(run=run_gif)
+    commands['gif'] = gif
+
+    order_plot = subparsers.add_parser(
+        'order-plot', help='save a png of the boarding order')
+    add_boarding_arguments(order_plot)
+    order_plot.add_argument('--dpi', type=int, default=100)
+    order_plot.add_argument('--filename', help='default: method name + .png')
+    order_plot.set_defaults(run=run_order_plot)
+    commands['order-plot'] = order_plot
+
+    plot = subparsers.add_parser(
+        'plot', help='save a chart of sweep results')
+    plot.add_argument('chart', choices=list(CHARTS))
+    plot.add_argument('filename')
+    plot.add_argument('--data', 
+                      help='results file (default: where sweep saves them)')
+    plot.add_argument('--output-dir', default='data')
+    plot.add_argument('--format', default='csv', choices=['csv', 'parquet'])
+    plot.add_argument('--aggregate', action='store_true')
+    plot.add_argument('--shared-door', action='store_true')
+    plot.set_defaults(run=run_plot)
+    commands['plot'] = plot
+    return parser, commands
+
+
+def load_config(path):
+    """Return the contents of a yaml or json config file."""
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def expand_jobs(config):
+    """Return a list of the options of each job in a config, with one job
+    for each combination of the values in a job's grid. A config is
+    either a list of jobs or a dictionary with a list of jobs and
+    optional defaults for every job, e.g.
+
+        defaults: {engine: event, seed: 1}
+        jobs:
+          - command: sweep
+            sweep: by-method
+            output_dir: data/{rows}_rows
+            grid: {rows: [20, 30], abreast: [[3, 3], [2, 2, 2]]}
+    """
+    if isinstance(config, list):
+        config = {'jobs': config}
+    defaults = config.get('defaults', {})
+    jobs = []
+    for job in config['jobs']:
+        job = dict(job)
+        grid = job.pop('grid', {})
+        for values in product(*grid.values()):
+            jobs.append((defaults, dict(job, **dict(zip(grid, values)))))
+    return jobs
+
+
+def job_options(commands, defaults, job):
+    """Return the command and the complete options for a job, starting
+    from the command's default arguments. Defaults which do not apply to
+    the command are ignored, but unknown or missing job options, or 
+    values which are not one of an option's choices, raise a ValueError.
+    """
+    def normalise(options):
+        return {name.replace('-', '_'): value
+                for name, value in options.items()}
+
+    job = normalise(job)
+    command = job.pop('command')
+    if command not in commands:
+        raise ValueError('Unknown command {}'.format(command))
+    parser = commands[command]
+    actions = [action for action in parser._actions if action.dest != 'help']
+    options = {action.dest: parser.get_default(action.dest)
+               for action in actions}
+    options['run'] = parser.get_default('run')
+
+    for name, value in normalise(defaults).items():
+        if name in options:
+            options[name] = value
+    for name, value in job.items():
+        if name not in options:
+            raise ValueError('Unknown option {} for {}'.format(name,
+                                                               command))
+        options[name] = value
+    for action in actions:
+        value = options[action.dest]
+        if action.required and value is None:
+            raise ValueError('Missing option {} for {}'.format(action.dest,
+                                                               command))
+        if action.choices is not None and value is not None \
+                and value not in action.choices:
+            raise ValueError('{} must be one of {} for {}'.format(
+                action.dest, ', '.join(action.choices), command))
+    for name in FORMATTED:
+        if isinstance(options.get(name), str):
+            options[name] = options[name].format(**options)
+    return command, options
+
+
+def main(argv=None):
+    """Run the subcommand given on the command line, or each job in the
+    config file, in this process.
+    """
+    parser, commands = create_parser()
+    args = parser.parse_args(argv)
+    if args.config:
+        jobs = expand_jobs(load_config(args.config))
+        for count, (defaults, job) in enumerate(jobs, 1):
+            command, options = job_options(commands, defaults, job)
+            print('[{}/{}] {}'.format(count, len(jobs), command),
+                  file=sys.stderr)
+            options['run'](options)
+    elif args.command:
+        args.run(vars(args))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
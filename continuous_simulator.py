@@ -0,0 +1,153 @@
+from collections import deque
+from heapq import heappop, heappush
+from math import ceil, log
+
+from boarding_simulator import Boarding
+
+
+class ContinuousBoarding:
+    """Class to simulate boarding in continuous time. Passengers queue,
+    walk along the aisle and sit down following the same rules as
+    Boarding, with one passenger in each row of an aisle, but each action
+    takes its own time in seconds rather than one step:
+        walking - each passenger takes their own time to walk a row,
+                  drawn from a lognormal distribution with median
+                  walk_time and shape walk_sigma
+        stowing - passengers with a bag take bag_countdown (1, 2 or 3
+                  for fast, average or slow passengers) times a time
+                  drawn from a lognormal distribution with median
+                  stow_time and shape stow_sigma to put it away
+        sitting - passengers take shuffle_time for each seated passenger
+                  between the aisle and their seat, who stay in their
+                  seats rather than moving out into the aisle
+
+    Each passenger's next event is kept in a heap by time, and only the
+    passenger whose event is due is updated. Passengers blocked by the
+    passenger ahead wait until that row is left, so the time taken
+    depends on the number of events rather than on the length of the
+    boarding. Simultaneous events happen in boarding order.
+
+    Arguments
+        rows, abreast, method, bag_percent, slow_average_fast, n_groups,
+        seed, doors - as for the Boarding class, which creates the
+                      passengers and makes every random choice
+        walk_time, walk_sigma, stow_time, stow_sigma, shuffle_time - the
+            times in seconds described above
+    """
+
+    def __init__(self, rows, abreast, method, bag_percent, slow_average_fast,
+                 n_groups, seed=None, doors=None, walk_time=1.0,
+                 walk_sigma=0.2, stow_time=4.0, stow_sigma=0.5,
+                 shuffle_time=5.0):
+        self.aero = Boarding(rows, abreast, method, bag_percent,
+                             slow_average_fast, n_groups, seed=seed,
+                             doors=doors)
+        self.rows = rows
+        self.walk_time = walk_time
+        self.walk_sigma = walk_sigma
+        self.stow_time = stow_time
+        self.stow_sigma = stow_sigma
+        self.shuffle_time = shuffle_time
+
+    def seed(self, seed):
+        """Reseed the random number generator."""
+        self.aero.seed(seed)
+
+    def create_passengers(self):
+        """Return the passengers from Boarding.create_passengers and set
+        self.walk_times and self.stow_times, the seconds each passenger
+        takes to walk a row and to put their bag away (0 if they have no
+        bag).
+        """
+        plane = self.aero.create_passengers()
+        rng = self.aero.rng
+        self.walk_times = [rng.lognormvariate(log(self.walk_time),
+                                              self.walk_sigma)
+                           for passenger in plane]
+        self.stow_times = [p.bag_countdown
+                           * rng.lognormvariate(log(self.stow_time),
+                                                self.stow_sigma)
+                           if p.bag_countdown else 0 for p in plane]
+        return plane
+
+    def board_plane(self):
+        """Board the plane and save the time the last passenger sits down
+        as self.seconds, self.steps as the same time in steps of the
+        median walk_time, rounded up, and self.events as the number of
+        events processed.
+        """
+        plane = self.create_passengers()
+        self.plane = plane
+        aisles = self.aero.aisles
+        # Passengers in each row of each aisle, and passengers waiting
+        # for each row of each aisle to be left, in the order they
+        # started waiting.
+        self.occupancy = {aisle: [0] * (self.rows + 1) for aisle in aisles}
+        self.waiters = {aisle: [deque() for _ in range(self.rows + 1)]
+                        for aisle in aisles}
+        self.seat_map = {}
+        self.shuffled = [False] * len(plane)
+        self.events = 0
+        self.seconds = 0.0
+
+        self.heap = [(0.0, passenger) for passenger in range(len(plane))]
+        while self.heap:
+            time, passenger = heappop(self.heap)
+            self.events += 1
+            self.update_passenger(plane, passenger, time)
+        self.steps = ceil(self.seconds / self.walk_time - 1e-9)
+
+    def update_passenger(self, plane, passenger, time):
+        """Carry out a passenger's next action at the given time and
+        schedule the one after, if any.
+        """
+        p = plane[passenger]
+        if p.row == p.target[0]:
+            # Put any bag away, then climb past anyone seated between the
+            # aisle and the seat, then sit down.
+            if self.stow_times[passenger]:
+                heappush(self.heap,
+                         (time + self.stow_times[passenger], passenger))
+                self.stow_times[passenger] = 0
+                return
+            seat = self.seat_map
+            blocking = sum((p.row, a) in seat for a in
+                           self.aero.layout.blocked[(p.target[1], p.aisle)])
+            if blocking and not self.shuffled[passenger]:
+                self.shuffled[passenger] = True
+                heappush(self.heap,
+                         (time + blocking * self.shuffle_time, passenger))
+                return
+            p.seated = True
+            seat[p.target] = passenger
+            self.leave(p.row, p.aisle, time)
+            p.row = 0
+            self.seconds = max(self.seconds, time)
+            return
+
+        ahead = self.aero.row_ahead(p)
+        if self.occupancy[p.aisle][ahead]:
+            self.waiters[p.aisle][ahead].append(passenger)
+            return
+        if p.row > 0:
+            self.leave(p.row, p.aisle, time)
+        self.occupancy[p.aisle][ahead] += 1
+        p.row = ahead
+        heappush(self.heap, (time + self.walk_times[passenger], passenger))
+
+    def leave(self, row, aisle, time):
+        """Remove a passenger from a row of an aisle at the given time,
+        and if the row is now free, let the first passenger waiting for
+        it try to move into it.
+        """
+        self.occupancy[aisle][row] -= 1
+        waiters = self.waiters[aisle][row]
+        if self.occupancy[aisle][row] == 0 and waiters:
+            heappush(self.heap, (time, waiters.popleft()))
+
+    def return_times(self):
+        """Run the boarding simulation and return the time taken to board
+        the plane in seconds and in steps.
+        """
+        self.board_plane()
+        return self.seconds, self.steps
@@ -0,0 +1,147 @@
+from time import perf_counter
+
+from boarding_simulator import Boarding
+
+
+class BoardingStats:
+    """Class holding counts and times of what happens while boarding.
+    Each passenger update is counted under one branch:
+        stow - the passenger put their bag away, or with the event
+               engine, was scheduled to sit once it is put away
+        sit - the passenger sat down, after any shuffle of passengers
+              blocking the seat
+        advance - the passenger moved forward a row
+        blocked - the row ahead was occupied
+        idle - the passenger was skipped in a step, as they were seated
+               or, with the event engine, waiting for a row or their
+               bag. Skipped passengers take no time.
+    record counts and times recording each step. shuffled is the number
+    of seated passengers moved back into the aisle and blocked_calls the
+    number of calls to Boarding.blocked. Stats of several runs are
+    combined with merge.
+    """
+    BRANCHES = ('stow', 'sit', 'advance', 'blocked', 'idle', 'record')
+
+    def __init__(self):
+        self.counts = dict.fromkeys(self.BRANCHES, 0)
+        self.seconds = dict.fromkeys(self.BRANCHES, 0.0)
+        self.shuffled = 0
+        self.blocked_calls = 0
+        self.runs = 0
+        self.steps = 0
+        self.total_seconds = 0.0
+
+    def add(self, branch, seconds):
+        """Count one update under a branch taking the given seconds."""
+        self.counts[branch] += 1
+        self.seconds[branch] += seconds
+
+    def merge(self, other):
+        """Add the counts and times of another BoardingStats to these and
+        return these.
+        """
+        for branch in self.BRANCHES:
+            self.counts[branch] += other.counts[branch]
+            self.seconds[branch] += other.seconds[branch]
+        self.shuffled += other.shuffled
+        self.blocked_calls += other.blocked_calls
+        self.runs += other.runs
+        self.steps += other.steps
+        self.total_seconds += other.total_seconds
+        return self
+
+    def as_dict(self):
+        """Return the stats as a dictionary."""
+        return {'runs': self.runs, 'steps': self.steps,
+                'total_seconds': self.total_seconds,
+                'shuffled': self.shuffled,
+                'blocked_calls': self.blocked_calls,
+                'counts': dict(self.counts), 'seconds': dict(self.seconds)}
+
+    def report(self):
+        """Return a table of the count, total time and share of the total
+        boarding time of each branch.
+        """
+        lines = ['{} runs, {} steps, {:.3f} s'.format(
+                     self.runs, self.steps, self.total_seconds),
+                 '{:<10}{:>12}{:>12}{:>8}'.format('branch', 'count',
+                                                  'seconds', '%')]
+        for branch in self.BRANCHES:
+            share = 100 * self.seconds[branch] / (self.total_seconds or 1)
+            lines.append('{:<10}{:>12}{:>12.4f}{:>8.1f}'.format(
+                branch, self.counts[branch], self.seconds[branch], share))
+        lines.append('shuffled {}, blocked() calls {}'.format(
+            self.shuffled, self.blocked_calls))
+        return '\n'.join(lines)
+
+
+class ProfiledBoarding(Boarding):
+    """Boarding which counts and times each branch of each passenger
+    update, calls to blocked and recording each step in self.stats, a
+    BoardingStats for the last run. The simulation itself is unchanged
+    and Boarding is not slowed down, as the timing only happens in the
+    methods overridden here.
+    """
+    def board_plane(self, record='frames'):
+        self.stats = BoardingStats()
+        self.updated = set()
+        start = perf_counter()
+        super().board_plane(record)
+        self.stats.total_seconds = perf_counter() - start
+        self.stats.runs = 1
+        self.stats.steps = self.steps
+
+    def update_passenger(self, plane, passenger):
+        p = plane[passenger]
+        row = p.row
+        bag = p.bag_countdown
+        n_seated = self.n_seated
+        self.updated.add(passenger)
+        start = perf_counter()
+        super().update_passenger(plane, passenger)
+        seconds = perf_counter() - start
+
+        if p.seated:
+            branch = 'sit'
+            self.stats.shuffled += n_seated + 1 - self.n_seated
+        elif p.row != row:
+            branch = 'advance'
+        elif p.bag_countdown != bag:
+            branch = 'stow'
+        else:
+            branch = 'blocked'
+        self.stats.add(branch, seconds)
+        return plane
+
+    def update_passenger_event(self, plane, passenger):
+        p = plane[passenger]
+        # Passengers sitting down are counted by update_passenger, and 
+        # seated passengers are left as they are, so are idle.
+        if p.seated or (p.row == p.target[0] and p.bag_countdown == 0):
+            super().update_passenger_event(plane, passenger)
+            return
+        row = p.row
+        at_row = row == p.target[0]
+        self.updated.add(passenger)
+        start = perf_counter()
+        super().update_passenger_event(plane, passenger)
+        seconds = perf_counter() - start
+
+        if at_row:
+            branch = 'stow'
+        elif p.row != row:
+            branch = 'advance'
+        else:
+            branch = 'blocked'
+        self.stats.add(branch, seconds)
+
+    def blocked(self, seat, aisle):
+        self.stats.blocked_calls += 1
+        return super().blocked(seat, aisle)
+
+    def record_step(self, plane):
+        self.stats.counts['idle'] += len(plane) - len(self.updated)
+        self.updated.clear()
+        start = perf_counter()
+        super().record_step(plane)
+        self.stats.add('record', perf_counter() - start)
@@ -0,0 +1,260 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from shutil import which
+import subprocess
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from PIL.GifImagePlugin import getdata, getheader
+
+
+WHITE, BLACK, GREY = 0, 1, 2
+PASSENGER_COLOURS = ['#003f5c', '#374c80', '#7a5195', '#bc5090', '#ef5675',
+                     '#ff764a', '#ffa600']
+
+
+def hex_to_rgb(colour):
+    """Return a hex colour string as a tuple of red, green and blue."""
+    return tuple(int(colour[i:i + 2], 16) for i in (1, 3, 5))
+
+
+class RasterRenderer:
+    """Class to draw the frames of a boarding animation as palette images
+    with PIL. The seat map is drawn once into a background image and each
+    frame is a copy of the background with the passengers drawn on top at
+    their recorded positions, so no figure is redrawn for each step. The
+    renderer keeps no reference to the Boarding, so it can be sent to
+    other processes.
+
+    Arguments
+        aero - a Boarding which has been boarded with record='deltas'
+        width - the width of the frames in pixels
+    """
+    def __init__(self, aero, width=1200):
+        abreast = sum(aero.abreast)
+        self.span = abreast + len(aero.abreast) - 1
+        self.cell = width // aero.rows
+        self.title_height = max(self.cell, 24)
+        # Even dimensions so the frames can also be encoded as video.
+        self.width = (aero.rows * self.cell + 1) // 2 * 2
+        self.height = (self.span * self.cell + self.title_height + 1) // 2 * 2
+
+        palette = [(255, 255, 255), (0, 0, 0), (160, 160, 160)]
+        palette += [hex_to_rgb(colour) for colour in PASSENGER_COLOURS]
+        self.palette = [value for colour in palette for value in colour]
+        self.colours = [GREY + 1 + i % len(PASSENGER_COLOURS)
+                        for i in range(len(aero.initial_plane))]
+        self.background = self.draw_background(aero)
+
+    def to_pixels(self, x, y):
+        """Return the pixel coordinates of the centres of the cells at
+        plot coordinates x (row) and y (seat or aisle).
+        """
+        x = np.asarray(x)
+        y = np.asarray(y)
+        px = (x - 0.5) * self.cell
+        py = self.title_height + (self.span + 0.5 - y) * self.cell
+        return px, py
+
+    def font(self, size):
+        """Return the default font at the given size."""
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:
+            return ImageFont.load_default()
+
+    def draw_background(self, aero):
+        """Return an image of the title, the seats with their labels and
+        the dashed lines either side of each aisle.
+        """
+        image = Image.new('P', (self.width, self.height), WHITE)
+        image.putpalette(self.palette)
+        draw = ImageDraw.Draw(image)
+
+        title = 'Method: ' + aero.method + '  -  Steps: ' + str(aero.steps)
+        draw.text((self.cell // 4, self.title_height // 2), title,
+                  fill=BLACK, anchor='lm', font=self.font(14))
+
+        # Squares for the seats labelled with their number, e.g. 1A.
+        aisle_labels = 'ABCDEFGHJKLMN'
+        targets = [passenger.target for passenger in aero.initial_plane]
+        x, y = self.to_pixels(*zip(*targets))
+        half = 0.45 * self.cell
+        label_font = self.font(max(int(self.cell * 0.3), 6))
+        for (row, seat), px, py in zip(targets, x, y):
+            draw.rectangle([px - half, py - half, px + half, py + half],
+                           outline=BLACK)
+            label = str(row) + aisle_labels[aero.seats.index(seat)]
+            draw.text((px, py), label, fill=BLACK, anchor='mm',
+                      font=label_font)
+
+        # Dashed lines either side of each aisle.
+        dash = max(self.cell // 4, 2)
+        for aisle in aero.aisles:
+            for edge in (aisle - 0.5, aisle + 0.5):
+                _, py = self.to_pixels(0, edge)
+                for start in range(0, self.width, 2 * dash):
+                    draw.line([start, py, start + dash, py], fill=BLACK)
+        return image
+
+    def draw_frame(self, positions):
+        """Return a frame with each passenger drawn at their (row, aisle
+        or seat) position. Passengers in row 0 are not yet on the plane
+        and are not drawn.
+        """
+        frame = self.background.copy()
+        draw = ImageDraw.Draw(frame)
+        positions = np.asarray(positions)
+        on_plane = np.flatnonzero(positions[:, 0] > 0)
+        x, y = self.to_pixels(positions[on_plane, 0], positions[on_plane, 1])
+        radius = 0.3 * self.cell
+        for passenger, px, py in zip(on_plane, x, y):
+            draw.ellipse([px - radius, py - radius, px + radius, py + radius],
+                         fill=self.colours[passenger])
+        return frame
+
+    def frames(self, positions):
+        """Yield a frame for each array of positions in turn."""
+        for step_positions in positions:
+            yield self.draw_frame(step_positions)
+
+    def encode_chunk(self, positions, previous, video, duration):
+        """Return a list of the encoded data of a frame for each array of
+        positions: GIF frame data, or RGB pixels if video is True. GIF
+        frames only store the change from the frame before, which for
+        the first frame is drawn from the previous positions (the whole
+        frame is stored if previous is None).
+        """
+        if video:
+            return [frame.convert('RGB').tobytes()
+                    for frame in self.frames(positions)]
+        if previous is not None:
+            previous = np.asarray(self.draw_frame(previous))
+        data = []
+        for frame in self.frames(positions):
+            data.append(encode_gif_frame(frame, previous, duration))
+            previous = np.asarray(frame)
+        return data
+
+
+def encode_gif_frame(frame, previous, duration):
+    """Return the GIF data for a frame, storing only the rectangle which
+    differs from the previous frame's pixels (the whole frame if previous
+    is None).
+    """
+    if previous is None:
+        box = (0, 0) + frame.size
+    else:
+        changed = np.asarray(frame) != previous
+        rows = np.flatnonzero(changed.any(axis=1))
+        columns = np.flatnonzero(changed.any(axis=0))
+        if len(rows) == 0:
+            box = (0, 0, 1, 1)
+        else:
+            box = (columns[0], rows[0], columns[-1] + 1, rows[-1] + 1)
+    data = getdata(frame.crop(box), offset=box[:2], duration=duration,
+                   disposal=1)
+    return b''.join(data)
+
+
+def encode_chunk(task):
+    """Return the encoded frames of a chunk of positions. task is a tuple
+    of the renderer and the arguments of RasterRenderer.encode_chunk.
+    """
+    renderer, positions, previous, video, duration = task
+    return renderer.encode_chunk(positions, previous, video, duration)
+
+
+class GIFStream:
+    """Class to write a GIF one frame at a time, so frames do not need to
+    be held in memory. All frames must share the palette of the first.
+
+    Arguments
+        filename - the path of the GIF
+        background - an image with the size and palette of the frames
+        duration - the time each frame is shown in milliseconds
+        loop - the number of times to loop (0 to loop forever)
+    """
+    def __init__(self, filename, background, duration=300, loop=0):
+        self.file = open(filename, 'wb')
+        header, _ = getheader(background.copy(),
+                              info={'loop': loop, 'duration': duration})
+        self.file.write(b''.join(header))
+
+    def write(self, data):
+        """Add a frame encoded by encode_gif_frame to the GIF."""
+        self.file.write(data)
+
+    def close(self):
+        """Write the end of the GIF and close the file."""
+        self.file.write(b';')
+        self.file.close()
+
+
+class MP4Stream:
+    """Class to write an MP4 video one frame at a time by piping the
+    frames to ffmpeg, which must be installed.
+
+    Arguments
+        filename - the path of the video
+        size - the (width, height) of the frames, both even
+        duration - the time each frame is shown in milliseconds
+    """
+    def __init__(self, filename, size, duration=300):
+        ffmpeg = which('ffmpeg')
+        if ffmpeg is None:
+            raise RuntimeError('ffmpeg is needed to save MP4 files')
+        command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo',
+                   '-pix_fmt', 'rgb24', '-s', '{}x{}'.format(*size),
+                   '-r', str(1000 / duration), '-i', '-',
+                   '-pix_fmt', 'yuv420p', filename]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, data):
+        """Add a frame of RGB pixels to the video."""
+        self.process.stdin.write(data)
+
+    def close(self):
+        """Finish encoding the video."""
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError('ffmpeg failed to save the video')
+
+
+def save_animation(renderer, positions, filename, duration=300, n_workers=1,
+                   chunk_size=32):
+    """Draw a frame for each array of positions and write them to a GIF,
+    or to an MP4 video if filename ends with .mp4. Frames are drawn and
+    encoded in chunks of chunk_size across n_workers processes and
+    written in order as each chunk is finished.
+    """
+    video = filename.endswith('.mp4')
+    if video:
+        stream = MP4Stream(filename, (renderer.width, renderer.height),
+                           duration)
+    else:
+        stream = GIFStream(filename, renderer.background, duration)
+
+    def tasks():
+        # Positions arrays may be reused by the iterable, so are copied.
+        positions_iter = (np.array(step) for step in positions)
+        previous = None
+        while True:
+            chunk = list(islice(positions_iter, chunk_size))
+            if not chunk:
+                return
+            yield renderer, chunk, previous, video, duration
+            previous = chunk[-1]
+
+    try:
+        if n_workers == 1:
+            for data in map(encode_chunk, tasks()):
+                for frame in data:
+                    stream.write(frame)
+        else:
+            with ProcessPoolExecutor(n_workers) as executor:
+                for data in executor.map(encode_chunk, tasks()):
+                    for frame in data:
+                        stream.write(frame)
+    finally:
+        stream.close()
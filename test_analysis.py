@@ -0,0 +1,62 @@
+"""Regression tests for stopping and resuming sweeps with Simulations.
+Run with `python -m pytest test_analysis.py`.
+"""
+import pytest
+
+from analysis import ResultWriter, Simulations
+
+
+def run(output_dir, resume=False, rows=6, bag_percent=0.5):
+    """Run the by-aisles sweep and return the text of its results and
+    summary files.
+    """
+    aero = Simulations(rows, [3, 3], bag_percent, [0.2, 0.6, 0.2], 'event',
+                       n_runs=5, seed=1, resume=resume,
+                       output_dir=str(output_dir))
+    aero.steps_by_no_aisles()
+    return ((output_dir / 'by_aisles_data.csv').read_text(),
+            (output_dir / 'by_aisles_data_summary.csv').read_text())
+
+
+def interrupt(monkeypatch, output_dir, n_cells, **settings):
+    """Run the by-aisles sweep, stopping it after n_cells cells have been
+    written.
+    """
+    write = ResultWriter.write
+
+    def write_then_stop(writer, cell, df, summary):
+        if len(writer.completed) == n_cells:
+            raise KeyboardInterrupt
+        write(writer, cell, df, summary)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ResultWriter, 'write', write_then_stop)
+        with pytest.raises(KeyboardInterrupt):
+            run(output_dir, **settings)
+
+
+def test_resume_matches_uninterrupted_sweep(tmp_path, monkeypatch):
+    expected = run(tmp_path / 'full')
+    interrupt(monkeypatch, tmp_path / 'resumed', 3)
+    assert run(tmp_path / 'resumed', resume=True) == expected
+
+
+@pytest.mark.parametrize('settings', [{'bag_percent': 0.9}, {'rows': 8}])
+def test_resume_with_other_settings_raises(tmp_path, monkeypatch, settings):
+    interrupt(monkeypatch, tmp_path, 3)
+    results = (tmp_path / 'by_aisles_data.csv').read_text()
+    with pytest.raises(ValueError):
+        run(tmp_path, resume=True, **settings)
+    assert (tmp_path / 'by_aisles_data.csv').read_text() == results
+
+
+def test_resume_by_method_with_other_abreast_raises(tmp_path):
+    aero = Simulations(6, [3, 3], 0.5, [0.2, 0.6, 0.2], 'event', n_runs=2,
+                       seed=1, output_dir=str(tmp_path))
+    aero.methods = ['random']
+    aero.steps_by_method()
+    aero = Simulations(6, [2, 2, 2], 0.5, [0.2, 0.6, 0.2], 'event',
+                       n_runs=2, seed=1, resume=True,
+                       output_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        aero.steps_by_method()
@@ -0,0 +1,59 @@
+"""Regression tests checking the scan, grid and event engines of Boarding
+give the same results. Run with `python -m pytest test_engines.py`.
+"""
+from itertools import product
+
+import pytest
+
+from boarding_simulator import Boarding
+
+
+ENGINES = ['scan', 'grid', 'event']
+CONFIGURATIONS = [[3, 3], [2, 2, 2], [2, 3, 2], [3, 4, 3]]
+METHODS = ['random', 'back-to-front WMA']
+SEEDS = [0, 1, 2]
+# The front door only, front and rear doors, and a door mid-cabin, from
+# which passengers walk both towards the front and the rear.
+DOORS = [None, [1, 12], [6]]
+
+
+def board(engine, abreast, method, seed, doors=None, shared_door=False):
+    """Return the steps taken by one boarding and the seat, position and
+    seated status of every passenger in each recorded frame. Bag 
+    countdowns are left out, as the event engine schedules passengers to
+    sit down rather than counting their bag down each step.
+    """
+    aero = Boarding(12, abreast, method, 0.7, [0.2, 0.6, 0.2], 4,
+                    engine=engine, seed=seed, doors=doors, 
+                    shared_door=shared_door)
+    aero.board_plane()
+    frames = [[(p.target, p.row, p.aisle, p.seated) for p in frame]
+              for frame in aero.frames]
+    return aero.steps, frames
+
+
+@pytest.mark.parametrize('shared_door', [False, True])
+@pytest.mark.parametrize('doors', DOORS)
+@pytest.mark.parametrize('abreast, method, seed',
+                         list(product(CONFIGURATIONS, METHODS, SEEDS)))
+def test_engines_agree(abreast, method, seed, doors, shared_door):
+    steps, frames = board('scan', abreast, method, seed, doors, shared_door)
+    assert len(frames) == steps
+    for engine in ENGINES[1:]:
+        assert board(engine, abreast, method, seed, doors, 
+                     shared_door) == (steps, frames)
+
+
+@pytest.mark.parametrize('abreast', CONFIGURATIONS)
+def test_return_steps_agree(abreast):
+    results = []
+    for engine in ENGINES:
+        aero = Boarding(12, abreast, 'random', 0.7, [0.2, 0.6, 0.2], 12,
+                        engine=engine)
+        steps = []
+        for seed in SEEDS:
+            aero.seed(seed)
+            steps.append(aero.return_steps())
+        results.append(steps)
+    assert results[1] == results[0]
+    assert results[2] == results[0]